@@ -0,0 +1,94 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.settings import knox_settings
+
+
+def get_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def token_key(token):
+    return 'auth:token:' + hashlib.sha256(token).hexdigest()
+
+
+def user_version_key(user_id):
+    return f'auth:user:{user_id}:version'
+
+
+def get_user_version(user_id):
+    cache = get_cache()
+    key = user_version_key(user_id)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, uuid.uuid4().hex, timeout=None)
+    return cache.get(key)
+
+
+def revoke_user(user_id):
+    """Делает недействительными все закэшированные токены пользователя."""
+    get_cache().set(user_version_key(user_id), uuid.uuid4().hex, None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Knox-аутентификация с кэшем проверенных токенов.
+
+    Knox ищет токены по префиксу и сверяет SHA-512 с БД на каждом запросе.
+    Здесь результат проверки хранится в ограниченном кэше с TTL под
+    sha256 от токена вместе с версией пользователя. Версия меняется при
+    удалении любого его токена (выход), сохранении пользователя и смене
+    пароля, и все его записи в кэше сразу перестают действовать.
+    """
+
+    def authenticate_credentials(self, token):
+        cache = get_cache()
+        key = token_key(token)
+        entry = cache.get(key)
+        if entry is not None:
+            user, auth_token, version = entry
+            expired = (
+                auth_token.expiry is not None
+                and auth_token.expiry < timezone.now()
+            )
+            if not expired and version == get_user_version(user.id):
+                self.refresh(cache, key, user, auth_token, version)
+                return user, auth_token
+            cache.delete(key)
+
+        user, auth_token = super().authenticate_credentials(token)
+        timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+        if auth_token.expiry is not None and not knox_settings.AUTO_REFRESH:
+            timeout = min(
+                timeout,
+                (auth_token.expiry - timezone.now()).total_seconds(),
+            )
+        if timeout > 0:
+            cache.set(
+                key, (user, auth_token, get_user_version(user.id)), timeout
+            )
+        return user, auth_token
+
+    def refresh(self, cache, key, user, auth_token, version):
+        """Продлевает токен при AUTO_REFRESH, как knox без кэша.
+
+        renew_token сам пропускает запись в БД чаще
+        MIN_REFRESH_INTERVAL; после записи обновляется и запись в кэше,
+        иначе каждый следующий запрос видел бы старый срок.
+        """
+        if not knox_settings.AUTO_REFRESH or auth_token.expiry is None:
+            return
+        previous = auth_token.expiry
+        self.renew_token(auth_token)
+        renewed = (auth_token.expiry - previous).total_seconds()
+        if renewed > knox_settings.MIN_REFRESH_INTERVAL:
+            cache.set(
+                key, (user, auth_token, version),
+                settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+        else:
+            auth_token.expiry = previous
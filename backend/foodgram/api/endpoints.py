@@ -0,0 +1,67 @@
+from django.conf import settings
+from foods.models import Follow, Ingredient, Recipe, Tag
+
+# Отдельные кэши в памяти процесса: кэши работающего приложения
+# не читаются и не засоряются. Пустые они только вначале — первый запрос
+# к маршруту доходит до БД, повторные после прогрева обслуживаются
+# из кэша, как в работающем приложении
+ISOLATED_CACHES = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': f'endpoints-{alias}',
+    }
+    for alias in settings.CACHES
+}
+
+
+def sample_endpoints(user):
+    """GET-маршруты API с параметрами, подставленными из текущих данных.
+
+    Возвращает пары (имя, путь). Маршруты, для которых в базе нет
+    подходящих объектов, пропускаются.
+    """
+    endpoints = [
+        ('recipes', '/api/recipes/'),
+        ('recipes_cursor', '/api/recipes/?pagination=cursor'),
+        ('recipes_favorited', '/api/recipes/?is_favorited=1'),
+        ('recipes_in_cart', '/api/recipes/?is_in_shopping_cart=1'),
+        ('download_shopping_cart', '/api/recipes/download_shopping_cart/'),
+        ('shopping_cart_summary', '/api/recipes/shopping_cart_summary/'),
+        ('subscriptions', '/api/users/subscriptions/'),
+        ('feed', '/api/recipes/feed/'),
+        ('users', '/api/users/'),
+        ('users_me', '/api/users/me/'),
+        ('tags', '/api/tags/'),
+        ('ingredients', '/api/ingredients/'),
+    ]
+    recipe = Recipe.objects.order_by('-pub_date').first()
+    if recipe is not None:
+        endpoints += [
+            ('recipe', f'/api/recipes/{recipe.id}/'),
+            ('recipes_by_name', f'/api/recipes/?name={recipe.name[:3]}'),
+            ('recipes_search',
+             f'/api/recipes/?search={recipe.name.split()[0]}'),
+        ]
+    author = (
+        Follow.objects.filter(user=user).values_list('author', flat=True)
+        .first()
+        or user.id
+    )
+    endpoints += [
+        ('recipes_by_author', f'/api/recipes/?author={author}'),
+        ('user', f'/api/users/{author}/'),
+    ]
+    tag = Tag.objects.first()
+    if tag is not None:
+        endpoints += [
+            ('recipes_by_tag', f'/api/recipes/?tags={tag.slug}'),
+            ('tag', f'/api/tags/{tag.id}/'),
+        ]
+    ingredient = Ingredient.objects.first()
+    if ingredient is not None:
+        endpoints += [
+            ('ingredients_by_name',
+             f'/api/ingredients/?name={ingredient.name[:3]}'),
+            ('ingredient', f'/api/ingredients/{ingredient.id}/'),
+        ]
+    return endpoints
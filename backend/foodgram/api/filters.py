@@ -0,0 +1,83 @@
+from django import forms
+from django.db.models import Exists, OuterRef
+from django_filters import rest_framework as filters
+from foods.models import Favorite, PurchaseList, Recipe
+from foods.search import full_text_search, search_by_name
+
+# Значения is_favorited и is_in_shopping_cart, включающие фильтр
+TRUE_VALUES = ('1', 'true')
+
+
+class MultipleValueField(forms.MultipleChoiceField):
+    """Список значений без проверки по заранее известным вариантам."""
+
+    def valid_value(self, value):
+        return True
+
+
+class MultipleValueFilter(filters.MultipleChoiceFilter):
+    field_class = MultipleValueField
+
+
+class RecipeFilter(filters.FilterSet):
+    """Фильтры списка рецептов.
+
+    Теги, избранное и корзина проверяются подзапросами EXISTS, поэтому
+    строки рецептов не размножаются JOIN'ом и DISTINCT не нужен.
+    Django 2.2 не умеет передавать Exists прямо в filter(), так что
+    подзапрос сначала аннотируется, а затем по нему фильтруется.
+    """
+    tags = MultipleValueFilter(method='filter_tags')
+    author = filters.NumberFilter(field_name='author')
+    name = filters.CharFilter(method='filter_name')
+    search = filters.CharFilter(method='filter_search')
+    is_favorited = filters.CharFilter(method='filter_is_favorited')
+    is_in_shopping_cart = filters.CharFilter(
+        method='filter_is_in_shopping_cart'
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('tags', 'author', 'name', 'search', 'is_favorited',
+                  'is_in_shopping_cart')
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.annotate(
+            has_tags=Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__slug__in=value
+            ))
+        ).filter(has_tags=True)
+
+    def filter_name(self, queryset, name, value):
+        return search_by_name(queryset, value)
+
+    def filter_search(self, queryset, name, value):
+        return full_text_search(queryset, value)
+
+    def filter_user_exists(self, queryset, model, annotation, value):
+        # Для анонимного пользователя фильтры по избранному и корзине
+        # не применяются
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        if value not in TRUE_VALUES:
+            # Как и до перехода на FilterSet: любое другое значение дает
+            # пустой список, а не рецепты вне избранного
+            return queryset.none()
+        return queryset.annotate(**{
+            annotation: Exists(model.objects.filter(
+                recipe=OuterRef('pk'), user=user
+            ))
+        }).filter(**{annotation: True})
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_user_exists(
+            queryset, Favorite, 'in_favorites', value
+        )
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_user_exists(
+            queryset, PurchaseList, 'in_shopping_cart', value
+        )
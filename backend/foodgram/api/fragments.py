@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import caches
+from foods.models import Recipe
+from foods.recipe_cache import fragment_versions
+
+from .serializers import get_membership
+
+
+def get_cache():
+    return caches[settings.RECIPE_FRAGMENT_CACHE_ALIAS]
+
+
+def overlay(fragment, recipe, membership):
+    """Подставляет в общий фрагмент флаги текущего пользователя и
+    favorites_count из уже загруженной строки рецепта."""
+    data = dict(fragment)
+    data['author'] = dict(
+        fragment['author'],
+        is_subscribed=recipe.author_id in membership.follows,
+    )
+    data['is_favorited'] = recipe.pk in membership.favorites
+    data['is_in_shopping_cart'] = recipe.pk in membership.cart
+    # Счетчик меняется при каждом добавлении в избранное, поэтому
+    # не входит в версию фрагмента
+    data['favorites_count'] = recipe.favorites_count
+    return data
+
+
+def serialize_recipes(recipes, serializer_class, context):
+    """Сериализует рецепты, беря общую для всех часть из кэша.
+
+    Фрагменты хранятся под версией рецепта (recipe_cache), отдельно для
+    каждого сериализатора и адреса сайта — в них абсолютные ссылки на
+    фото. Промахи загружаются с with_related() одним набором запросов.
+    """
+    recipes = list(recipes)
+    origin = context['request'].build_absolute_uri('/')
+    keys = {
+        pk: f'recipe:{serializer_class.__name__}:{origin}:{pk}:{version}'
+        for pk, version in fragment_versions(recipes).items()
+    }
+    cache = get_cache()
+    found = cache.get_many(keys.values())
+    fragments = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in keys if pk not in fragments]
+    if missing:
+        serializer = serializer_class(
+            Recipe.objects.with_related().filter(pk__in=missing),
+            many=True, context=context,
+        )
+        fresh = {fragment['id']: fragment for fragment in serializer.data}
+        cache.set_many({keys[pk]: fragment for pk, fragment in fresh.items()})
+        fragments.update(fresh)
+    membership = get_membership(context)
+    return [
+        overlay(fragments[recipe.pk], recipe, membership)
+        for recipe in recipes
+        if recipe.pk in fragments
+    ]
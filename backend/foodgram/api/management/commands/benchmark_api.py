@@ -0,0 +1,305 @@
+import base64
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from api.endpoints import ISOLATED_CACHES, sample_endpoints
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from foods.models import Follow, Ingredient, PurchaseList, Recipe, Tag, User
+from PIL import Image
+from rest_framework.test import APIClient
+
+PASSWORD = 'benchmark-password'
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class SQLTimer:
+    """execute_wrapper, считающий запросы и время их выполнения."""
+
+    def __init__(self):
+        self.queries = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.elapsed += time.perf_counter() - started
+            self.queries += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все маршруты API через тестовый клиент на временной '
+        'БД с данными seed_scale и пишет JSON с перцентилями задержки, '
+        'числом и временем SQL и размером ответа'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--users', type=int, default=200,
+            help='Пользователей во временной БД (seed_scale --users)'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=2000,
+            help='Рецептов во временной БД (seed_scale --recipes)'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--user', help='Имя пользователя, от которого идут запросы'
+        )
+        parser.add_argument(
+            '--output', help='Файл для JSON-отчета, по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--routes', nargs='*',
+            help='Только маршруты с этими именами'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('Нужна хотя бы одна итерация')
+        self.routes = options['routes']
+        self.samples = defaultdict(list)
+        self.info = {}
+        rounds = options['warmup'] + options['iterations']
+        # Транзакции фиксируются, как в работающем приложении, поэтому
+        # on_commit-обработчики (поиск, лента, версии фрагментов) тоже
+        # выполняются и попадают в замеры
+        with self.throwaway_database(options):
+            users = User.objects.order_by('id')
+            if options['user']:
+                users = users.filter(username=options['user'])
+            user = users.first()
+            if user is None:
+                raise CommandError('Пользователь не найден')
+            self.prepare(user)
+            for iteration in range(rounds):
+                self.record = iteration >= options['warmup']
+                self.run_round(iteration)
+
+        report = {
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'endpoints': {
+                name: self.summarize(name, samples)
+                for name, samples in self.samples.items()
+            },
+        }
+        content = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(content + '\n')
+        else:
+            self.stdout.write(content)
+        for name, result in sorted(report['endpoints'].items()):
+            self.stderr.write(
+                f'{name:28} p50 {result["p50_ms"]:8.2f} ms  '
+                f'p95 {result["p95_ms"]:8.2f} ms  '
+                f'p99 {result["p99_ms"]:8.2f} ms  '
+                f'SQL {result["queries"]:3}  {result["bytes"]} B'
+            )
+
+    @contextmanager
+    def throwaway_database(self, options):
+        """Временная БД и каталог медиа на время прогона.
+
+        Рабочие данные, кэши и загруженные файлы не меняются: БД
+        создается как тестовая и заполняется import_data и seed_scale,
+        после прогона она удаляется вместе с каталогом медиа.
+        """
+        workdir = tempfile.mkdtemp(prefix='benchmark-')
+        old_name = connection.settings_dict['NAME']
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        if connection.vendor == 'sqlite':
+            # Соединение с sqlite в памяти Django не закрывает,
+            # поэтому временная БД — файл в том же каталоге
+            test_settings['NAME'] = os.path.join(workdir, 'db.sqlite3')
+        try:
+            with override_settings(
+                CACHES=ISOLATED_CACHES,
+                MEDIA_ROOT=os.path.join(workdir, 'media'),
+            ):
+                connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, serialize=False
+                )
+                try:
+                    call_command('import_data', stdout=self.stderr)
+                    call_command(
+                        'seed_scale', users=options['users'],
+                        recipes=options['recipes'], seed=options['seed'],
+                        stdout=self.stderr,
+                    )
+                    yield
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            test_settings['NAME'] = old_test_name
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def prepare(self, user):
+        user.set_password(PASSWORD)
+        user.save()
+        self.user = user
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.author = User.objects.exclude(id=user.id).exclude(
+            id__in=Follow.objects.filter(user=user).values('author')
+        ).first()
+        self.cart_recipe = Recipe.objects.exclude(
+            id__in=PurchaseList.objects.filter(user=user).values('recipe')
+        ).first()
+        self.favorite_recipe = Recipe.objects.order_by('id').first()
+        self.bulk_recipes = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)[:20]
+        )
+        self.recipe_data = {
+            'name': 'Рецепт для замеров',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredients': [
+                {'id': pk, 'amount': 10}
+                for pk in Ingredient.objects.values_list('id', flat=True)[:5]
+            ],
+            'image': 'data:image/png;base64,' + base64.b64encode(
+                make_image()).decode(),
+        }
+
+    def run_round(self, iteration):
+        for name, path in sample_endpoints(self.user):
+            self.request(name, 'get', path)
+
+        response = self.request('login', 'post', '/api/auth/token/login/', {
+            'email': self.user.email, 'password': PASSWORD,
+        }, client=APIClient())
+        token_client = APIClient()
+        token_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}'
+        )
+        self.request(
+            'logout', 'post', '/api/auth/token/logout/', client=token_client
+        )
+        self.request('set_password', 'post', '/api/users/set_password/', {
+            'current_password': PASSWORD, 'new_password': PASSWORD,
+        })
+        self.request('user_create', 'post', '/api/users/', {
+            'email': f'benchmark{iteration}@example.com',
+            'username': f'benchmark{iteration}',
+            'first_name': 'Бенчмарк',
+            'last_name': 'Бенчмарк',
+            'password': PASSWORD,
+        })
+
+        if self.author is not None:
+            path = f'/api/users/{self.author.id}/subscribe/'
+            self.request('subscribe', 'post', path)
+            self.request('unsubscribe', 'delete', path)
+        if self.cart_recipe is not None:
+            path = f'/api/recipes/{self.cart_recipe.id}/shopping_cart/'
+            self.request('shopping_cart_add', 'post', path)
+            self.request('shopping_cart_remove', 'delete', path)
+        if self.favorite_recipe is not None:
+            path = f'/api/recipes/{self.favorite_recipe.id}/favorite/'
+            self.request('favorite_add', 'post', path)
+            self.request('favorite_remove', 'delete', path)
+        if self.bulk_recipes:
+            for name, path in (
+                ('shopping_cart_bulk', '/api/recipes/shopping_cart/'),
+                ('favorite_bulk', '/api/recipes/favorite/'),
+            ):
+                data = {'recipes': self.bulk_recipes}
+                self.request(f'{name}_add', 'put', path, data)
+                self.request(f'{name}_remove', 'delete', path, data)
+
+        if self.recipe_data['tags'] and self.recipe_data['ingredients']:
+            self.run_recipe_writes()
+
+    def run_recipe_writes(self):
+        response = self.request(
+            'recipe_create', 'post', '/api/recipes/', self.recipe_data
+        )
+        path = f'/api/recipes/{response.data["id"]}/'
+        self.request('recipe_update', 'patch', path, self.recipe_data)
+        self.request(
+            'recipe_image', 'put', path + 'image/',
+            {'image': SimpleUploadedFile('image.png', make_image())},
+            format='multipart',
+        )
+        self.request('recipe_delete', 'delete', path)
+        response = self.request(
+            'recipes_bulk', 'post', '/api/recipes/bulk/',
+            [self.recipe_data, self.recipe_data],
+        )
+        Recipe.objects.filter(
+            id__in=[recipe['id'] for recipe in response.data]
+        ).delete()
+
+    def request(self, name, method, path, data=None, client=None,
+                format='json'):
+        client = client or self.client
+        timer = SQLTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data, format=format)
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{name}: {method.upper()} {path} вернул '
+                f'{response.status_code}'
+            )
+        if self.record and (not self.routes or name in self.routes):
+            self.info[name] = (method.upper(), path)
+            self.samples[name].append((
+                elapsed,
+                timer.queries,
+                timer.elapsed,
+                size,
+            ))
+        return response
+
+    def summarize(self, name, samples):
+        method, path = self.info[name]
+        elapsed, queries, sql_time, size = zip(*samples)
+        result = {
+            'method': method,
+            'path': path,
+            'queries': max(queries),
+            'sql_ms': round(sum(sql_time) / len(sql_time) * 1000, 2),
+            'bytes': max(size),
+        }
+        for percent in PERCENTILES:
+            result[f'p{percent}_ms'] = round(
+                percentile(elapsed, percent) * 1000, 2
+            )
+        return result
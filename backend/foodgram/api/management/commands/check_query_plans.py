@@ -0,0 +1,101 @@
+from api.endpoints import ISOLATED_CACHES, sample_endpoints
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from foods.models import User
+from rest_framework.test import APIClient
+
+
+def seq_scans(plan):
+    """Имена таблиц, которые план читает последовательным сканированием."""
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', ()):
+        yield from seq_scans(child)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет GET-запросы к API, снимает их SQL и проверяет '
+        'через EXPLAIN, что большие таблицы не читаются Seq Scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Имя пользователя, от которого идут запросы'
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=10000,
+            help='Таблица считается большой начиная с этого числа строк'
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать план каждого запроса'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только с PostgreSQL')
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError('Пользователь не найден')
+
+        large_tables = self.large_tables(options['min_rows'])
+        client = APIClient()
+        client.force_authenticate(user)
+        failures = []
+        with override_settings(
+            CACHES=ISOLATED_CACHES, INGREDIENT_SEARCH_BACKEND='database'
+        ):
+            for name, path in sample_endpoints(user):
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(path)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{name}: {path} вернул {response.status_code}'
+                    )
+                for query in context.captured_queries:
+                    failures += self.check_query(
+                        name, query['sql'], large_tables, options
+                    )
+                self.stdout.write(
+                    f'{name}: запросов — {len(context.captured_queries)}'
+                )
+
+        for name, table, sql in failures:
+            self.stderr.write(f'{name}: Seq Scan по {table}\n  {sql}')
+        if failures:
+            raise CommandError(
+                f'Последовательных сканирований: {len(failures)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Планы запросов в порядке'))
+
+    def large_tables(self, min_rows):
+        # Оценка числа строк из статистики планировщика, без COUNT(*)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class "
+                "WHERE relkind = 'r' AND reltuples >= %s",
+                [min_rows],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def check_query(self, name, sql, large_tables, options):
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            plan = cursor.fetchone()[0][0]['Plan']
+        if options['verbose_plans']:
+            self.stdout.write(f'{sql}\n{plan}')
+        return [
+            (name, table, sql)
+            for table in seq_scans(plan)
+            if table in large_tables
+        ]
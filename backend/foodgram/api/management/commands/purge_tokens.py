@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+from django.utils import timezone
+from knox.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные токены пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        expired = AuthToken.objects.filter(expiry__lt=timezone.now())
+        deleted = 0
+        while True:
+            batch = list(
+                expired.values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            deleted += AuthToken.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f'Удалено просроченных токенов: {deleted}')
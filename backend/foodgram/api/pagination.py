@@ -0,0 +1,127 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from foods.feed import keyset
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class RecipePagination(PageNumberPagination):
+    """Постраничная выдача рецептов.
+
+    По умолчанию работает как PageNumberPagination. С параметром
+    ?pagination=cursor (или при переданном ?cursor=) переключается на
+    keyset-пагинацию по (pub_date, id): следующая страница выбирается
+    условием WHERE, а не OFFSET, и COUNT считается только на первой.
+    """
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.use_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_page_size(request)
+        cursor = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        self.count = None if cursor else queryset.count()
+        self.reverse = bool(cursor and cursor['r'])
+        results = self.fetch(queryset, cursor, self.limit + 1)
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.results = results
+        return results
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def fetch(self, queryset, cursor, limit):
+        return list(
+            keyset(queryset, 'pub_date', 'id', cursor, self.reverse)[:limit]
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.results:
+            return None
+        return self.build_link(self.results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if not self.results:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.build_link(self.results[0], reverse=True)
+
+    def build_link(self, recipe, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(recipe, reverse)
+        )
+
+    def encode_cursor(self, recipe, reverse):
+        payload = json.dumps({
+            'p': recipe.pub_date.isoformat(),
+            'i': recipe.id,
+            'r': int(reverse),
+        }, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            padding = '=' * (-len(token) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(token + padding))
+            cursor['p'] = parse_datetime(cursor['p'])
+            cursor['i'] = int(cursor['i'])
+            cursor['r'] = bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['p'] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+
+class FeedPagination(RecipePagination):
+    """Лента подписок листается только курсором: вместо queryset
+    передается foods.feed.Feed."""
+
+    def use_cursor(self, request):
+        return True
+
+    def fetch(self, feed, cursor, limit):
+        return feed.page(cursor, self.reverse, limit)
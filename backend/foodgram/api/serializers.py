@@ -1,15 +1,30 @@
+from django.conf import settings
 from django.contrib import auth
-from django.core.paginator import Paginator
-from django.db import models, transaction
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
 from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from drf_extra_fields.fields import Base64ImageField
-from foods.models import (Favorite, Follow, Ingredient, IngredientsAmount,
-                          PurchaseList, Recipe, Tag, username_validator)
+from foods import counters, feed, membership_cache, shopping_list
+from foods.images import WEBP, store_image, thumbnail_name
+from foods.models import (Follow, Ingredient, IngredientsAmount, Recipe, Tag,
+                          username_validator)
+from foods.search import update_search_index
 from rest_framework import serializers
 
 User = auth.get_user_model()
 
+RECIPE_IDS_LIMIT = 1000
+
+
+def get_membership(context):
+    """Избранное, корзина и подписки текущего пользователя,
+    загруженные один раз на запрос."""
+    request = context['request']
+    if not hasattr(request, 'membership'):
+        request.membership = membership_cache.get_membership(request.user)
+    return request.membership
+
 
 class UserLoginSerializers(serializers.ModelSerializer):
     email = serializers.CharField()
@@ -25,13 +40,13 @@ class UserLoginSerializers(serializers.ModelSerializer):
     def validate(self, data):
         email = data['email']
         password = data['password']
-        user_queryset = (
-            User.objects.filter(models.Q(email__iexact=email) | models.Q(
-                username__iexact=email)).distinct()
-        )
-        if user_queryset.exists() and user_queryset.count() == 1:
-            user = user_queryset.first()
-            if auth.authenticate(username=user.username, password=password):
+        # Один запрос по индексам lower(email)/lower(username), второй
+        # найденный пользователь означает неоднозначный логин
+        users = list(User.objects.filter_by_login(email)[:2])
+        if len(users) == 1:
+            user = users[0]
+            if user.is_active and user.check_password(password):
+                data['user'] = user
                 return data
             raise serializers.ValidationError("Incorrect Password!")
         raise serializers.ValidationError("Not Valid Email!")
@@ -65,9 +80,7 @@ class UserSerializer(serializers.ModelSerializer):
             'write_only': True, 'min_length': 4}}
 
     def get_is_subscribed(self, obj):
-        current_user = self.context['request'].user.id
-        return Follow.objects.filter(
-            user_id=current_user, author_id=obj.id).exists()
+        return obj.id in get_membership(self.context).follows
 
     def create(self, validated_data):
         user = User.objects.create(
@@ -92,9 +105,7 @@ class SpecificUserSerializer(serializers.ModelSerializer):
             'write_only': True, 'min_length': 4}}
 
     def get_is_subscribed(self, obj):
-        current_user = self.context['request'].user.id
-        return Follow.objects.filter(
-            user_id=current_user, author_id=obj.id).exists()
+        return obj.id in get_membership(self.context).follows
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -114,9 +125,9 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientAmountCreateUpdateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-    )
+    # Существование ингредиентов проверяется одним запросом
+    # в RecipePostUpdateSerializer.validate_ingredients
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientsAmount
@@ -153,6 +164,7 @@ class RecipeListRetrieveSerializer(serializers.ModelSerializer):
             'image',
             'text',
             'cooking_time',
+            'favorites_count',
         )
 
     def get_ingredients(self, recipe):
@@ -162,27 +174,60 @@ class RecipeListRetrieveSerializer(serializers.ModelSerializer):
                     Returns:
                         list: Список ингридиентов в рецепте.
                     """
-        return recipe.ingredients.values(
-            'id', 'name', 'measurement_unit', amount=models.F('recipe__amount')
-        )
+        return [
+            {
+                'id': ingredient_amount.ingredients.id,
+                'name': ingredient_amount.ingredients.name,
+                'measurement_unit': (
+                    ingredient_amount.ingredients.measurement_unit
+                ),
+                'amount': ingredient_amount.amount,
+            }
+            for ingredient_amount in recipe.ingredient_amounts.all()
+        ]
 
     def get_is_favorited(self, recipe):
-        if self.context['request'].auth is None:
-            return False
-        user = self.context['request'].user
-        return Favorite.objects.filter(
-            user=user,
-            recipe=recipe,
-        ).exists()
+        return recipe.id in get_membership(self.context).favorites
 
     def get_is_in_shopping_cart(self, recipe):
-        if self.context['request'].auth is None:
-            return False
-        user = self.context['request'].user
-        return PurchaseList.objects.filter(
-            user=user,
-            recipe=recipe,
-        ).exists()
+        return recipe.id in get_membership(self.context).cart
+
+
+class RecipeListSerializer(RecipeListRetrieveSerializer):
+    """Рецепт в списке: вместо оригинала фото отдается превью."""
+    image = serializers.SerializerMethodField()
+    image_webp = serializers.SerializerMethodField()
+
+    class Meta(RecipeListRetrieveSerializer.Meta):
+        fields = RecipeListRetrieveSerializer.Meta.fields + ('image_webp',)
+
+    def get_thumbnail_url(self, recipe, extension=None):
+        name = thumbnail_name(
+            recipe.image.name, settings.RECIPE_LIST_IMAGE_SIZE, extension
+        )
+        if name is None:
+            if not recipe.image or extension is not None:
+                return None
+            url = recipe.image.url
+        else:
+            url = default_storage.url(name)
+        return self.context['request'].build_absolute_uri(url)
+
+    def get_image(self, recipe):
+        return self.get_thumbnail_url(recipe)
+
+    def get_image_webp(self, recipe):
+        return self.get_thumbnail_url(recipe, WEBP)
+
+
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """Загрузка фото рецепта файлом multipart/form-data: Django пишет
+    большие файлы во временный файл, а не держит их в памяти."""
+
+    class Meta:
+        model = Recipe
+        fields = ('image',)
+        extra_kwargs = {'image': {'required': True}}
 
 
 class CustomTagsSerializer(serializers.ListField):
@@ -193,6 +238,56 @@ class CustomTagsSerializer(serializers.ListField):
         return serializer.data
 
 
+class RecipeBulkCreateSerializer(serializers.ListSerializer):
+    """Создает список рецептов в одной транзакции пакетными вставками."""
+
+    @transaction.atomic
+    def create(self, validated_data):
+        author = self.context['request'].user
+        recipes, tags, ingredients = [], [], []
+        for data in validated_data:
+            tags.append(data.pop('tags'))
+            ingredients.append(data.pop('ingredients'))
+            recipe = Recipe(author=author, **data)
+            store_image(recipe.image)
+            recipes.append(recipe)
+        if connection.features.can_return_ids_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            # bulk_create не отправляет сигналы: счетчик автора, ленты
+            # и поисковый индекс обновляем сами
+            counters.change(User, author.id, 'recipes_count', len(recipes))
+            recipe_ids = [recipe.id for recipe in recipes]
+            transaction.on_commit(lambda: feed.publish(recipe_ids))
+            transaction.on_commit(lambda: update_search_index(recipe_ids))
+        else:
+            # save() отправляет post_save, обработчики делают то же самое
+            for recipe in recipes:
+                recipe.save()
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag)
+            for recipe, recipe_tags in zip(recipes, tags)
+            for tag in set(recipe_tags)
+        ])
+        IngredientsAmount.objects.bulk_create([
+            IngredientsAmount(
+                recipe_id=recipe.id,
+                ingredients_id=ingredient['id'],
+                amount=ingredient['amount'],
+            )
+            for recipe, recipe_ingredients in zip(recipes, ingredients)
+            for ingredient in recipe_ingredients
+        ])
+        return recipes
+
+    def to_representation(self, recipes):
+        request = self.context.get('request')
+        recipes = Recipe.objects.with_related().filter(
+            pk__in=[recipe.pk for recipe in recipes])
+        return RecipeListRetrieveSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+
+
 class RecipePostUpdateSerializer(serializers.ModelSerializer):
     tags = CustomTagsSerializer()
     ingredients = IngredientAmountCreateUpdateSerializer(many=True)
@@ -221,37 +316,80 @@ class RecipePostUpdateSerializer(serializers.ModelSerializer):
         ingredients_set = set(ingredients)
         if len(ingredients_set) != len(ingredients):
             raise serializers.ValidationError('Ошибка-одинаковые ингредиенты.')
+        missing = ingredients_set.difference(
+            Ingredient.objects.filter(
+                id__in=ingredients_set
+            ).values_list('id', flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не существуют: {sorted(missing)}.'
+            )
         return id
 
     def get_is_favorited(self, recipe):
-        if self.context['request'].auth is None:
-            return False
-        user = self.context['request'].user
-        return Favorite.objects.filter(
-            user=user,
-            recipe=recipe,
-        ).exists()
+        return recipe.id in get_membership(self.context).favorites
 
     def get_is_in_shopping_cart(self, recipe):
-        if self.context['request'].auth is None:
-            return False
-        user = self.context['request'].user
-        return PurchaseList.objects.filter(
-            user=user,
-            recipe=recipe,
-        ).exists()
+        return recipe.id in get_membership(self.context).cart
 
     def add_tags(self, tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
-
-    def add_or_edit_ingredients(self, recipe, ingredients):
-        for ingredient in ingredients:
-            IngredientsAmount.objects.get_or_create(
-                recipe=recipe,
-                ingredients=ingredient['id'],
-                amount=ingredient['amount']
+        recipe.tags.add(*tags)
+
+    def add_or_edit_ingredients(self, recipe, ingredients, created=False):
+        """Приводит ингредиенты рецепта к переданному списку.
+
+        Вместо пересоздания всех строк считает разницу с текущими:
+        новые добавляются одним bulk_create, измененные количества —
+        одним bulk_update, лишние удаляются одним DELETE.
+        """
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {} if created else {
+            ingredient_amount.ingredients_id: ingredient_amount
+            for ingredient_amount in recipe.ingredient_amounts.all()
+        }
+        previous = {
+            ingredient_id: ingredient_amount.amount
+            for ingredient_id, ingredient_amount in existing.items()
+        }
+        IngredientsAmount.objects.bulk_create([
+            IngredientsAmount(
+                recipe=recipe, ingredients_id=ingredient_id, amount=amount
             )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ])
+        changed = []
+        for ingredient_id, ingredient_amount in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != ingredient_amount.amount:
+                ingredient_amount.amount = amount
+                changed.append(ingredient_amount)
+        if changed:
+            IngredientsAmount.objects.bulk_update(changed, ('amount',))
+        removed = [
+            ingredient_amount.id
+            for ingredient_id, ingredient_amount in existing.items()
+            if ingredient_id not in amounts
+        ]
+        if removed:
+            # Один DELETE без сигналов: post_delete пришлось бы отправлять
+            # по строке, списки покупок обновляются ниже одним запросом
+            IngredientsAmount.objects.filter(id__in=removed)._raw_delete(
+                IngredientsAmount.objects.db
+            )
+        if not created:
+            # Разница количеств уходит в списки покупок с этим рецептом
+            shopping_list.recipe_changed(recipe.id, {
+                ingredient_id: (
+                    amounts.get(ingredient_id, 0)
+                    - previous.get(ingredient_id, 0)
+                )
+                for ingredient_id in amounts.keys() | previous.keys()
+            })
 
     @transaction.atomic
     def create(self, validated_data):
@@ -261,7 +399,7 @@ class RecipePostUpdateSerializer(serializers.ModelSerializer):
         validated_data['author'] = author
         recipe = Recipe.objects.create(**validated_data)
         self.add_tags(tags, recipe)
-        self.add_or_edit_ingredients(recipe, ingredients)
+        self.add_or_edit_ingredients(recipe, ingredients, created=True)
         return recipe
 
     @transaction.atomic
@@ -271,18 +409,19 @@ class RecipePostUpdateSerializer(serializers.ModelSerializer):
         super().update(instance, validated_data)
         recipe = instance
         recipe.tags.set(tags_list)
-        recipe.ingredients.clear()
         self.add_or_edit_ingredients(recipe, ingredients)
         return recipe
 
     def to_representation(self, recipe):
         request = self.context.get('request')
         context = {'request': request}
+        recipe = Recipe.objects.with_related().get(pk=recipe.pk)
         return RecipeListRetrieveSerializer(recipe,
                                             context=context).data
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeBulkCreateSerializer
         fields = (
             'id',
             'tags',
@@ -316,6 +455,36 @@ class RecipePurchaseSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного изменения избранного и корзины."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_IDS_LIMIT,
+    )
+
+    def validate_recipes(self, recipes):
+        recipes = list(dict.fromkeys(recipes))
+        if not self.context.get('check_exists'):
+            return recipes
+        missing = set(recipes).difference(
+            Recipe.objects.filter(id__in=recipes).values_list('id', flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не существуют: {sorted(missing)}.'
+            )
+        return recipes
+
+
+def get_recipes_limit(request):
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
+
 class FollowSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
@@ -361,21 +530,22 @@ class FollowSerializer(serializers.ModelSerializer):
         return author.last_name
 
     def get_is_subscribed(self, follow_or_follow_user):
-        current_user = self.context['request'].user.id
-        return Follow.objects.filter(
-            user_id=current_user,
-            author_id=follow_or_follow_user.id
-            if isinstance(
-                follow_or_follow_user,
-                User
-            )
-            else follow_or_follow_user.author.id
-        ).exists()
+        author_id = follow_or_follow_user.id if isinstance(
+            follow_or_follow_user,
+            User
+        ) else follow_or_follow_user.author_id
+
+        return author_id in get_membership(self.context).follows
 
     def get_recipes(self, follow_or_follow_user):
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit'
-        )
+        # FollowViewSet.list заранее подгружает рецепты всех авторов страницы
+        if hasattr(follow_or_follow_user, 'author_recipes'):
+            return RecipePurchaseSerializer(
+                follow_or_follow_user.author_recipes,
+                read_only=True,
+                many=True,
+            ).data
+        recipes_limit = get_recipes_limit(self.context.get('request'))
         recipes = Recipe.objects.filter(Q(
             author=follow_or_follow_user.id
             if isinstance(
@@ -388,11 +558,7 @@ class FollowSerializer(serializers.ModelSerializer):
         ))
 
         if recipes_limit is not None:
-            paginator = Paginator(recipes, per_page=recipes_limit)
-            page = paginator.get_page(
-                self.context.get('request').query_params.get('page', 1)
-            )
-            recipes = page.object_list
+            recipes = recipes[:recipes_limit]
 
         serializer = RecipePurchaseSerializer(
             recipes,
@@ -402,17 +568,11 @@ class FollowSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_recipes_count(self, follow_or_follow_user):
-        recipes = Recipe.objects.filter(
-            Q(
-                author=follow_or_follow_user.id
-                if isinstance(
-                    follow_or_follow_user,
-                    User
-                )
-                else follow_or_follow_user.author.id
-            ) & ~Q(
-                author=self.context.get('request').user
-            )
-        )
+        author = follow_or_follow_user if isinstance(
+            follow_or_follow_user,
+            User
+        ) else follow_or_follow_user.author
 
-        return recipes.count()
+        if author.id == self.context.get('request').user.id:
+            return 0
+        return author.recipes_count
@@ -0,0 +1,87 @@
+import csv
+import io
+
+from django.conf import settings
+from foods.models import ShoppingListItem
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+def get_shopping_cart_ingredients(user):
+    """Строки списка покупок пользователя, уже просуммированные
+    по ингредиентам: одно чтение по индексу (user, ingredient)."""
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient_id',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).order_by('ingredient__name')
+
+
+def format_line(row):
+    return '{} ({}) — {}'.format(
+        row['ingredient__name'],
+        row['ingredient__measurement_unit'],
+        row['amount'],
+    )
+
+
+def render_txt(rows):
+    for row in rows:
+        yield format_line(row) + '\n'
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for row in rows:
+        yield writer.writerow((
+            row['ingredient__name'],
+            row['ingredient__measurement_unit'],
+            row['amount'],
+        ))
+
+
+def render_pdf(rows):
+    # PDF нельзя отдать построчно: таблица ссылок пишется в конце файла,
+    # поэтому документ собирается постранично и отдается кусками.
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+        )
+    buffer = io.BytesIO()
+    document = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    y = height - PDF_MARGIN
+    document.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+    for row in rows:
+        if y < PDF_MARGIN:
+            document.showPage()
+            document.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        document.drawString(PDF_MARGIN, y, format_line(row))
+        y -= PDF_FONT_SIZE * 1.5
+    document.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+RENDERERS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
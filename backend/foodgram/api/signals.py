@@ -0,0 +1,19 @@
+from django.contrib import auth
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from knox.models import AuthToken
+
+from .authentication import revoke_user
+
+User = auth.get_user_model()
+
+
+@receiver(post_delete, sender=AuthToken)
+def revoke_deleted_token(instance, **kwargs):
+    revoke_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def revoke_changed_user(instance, created, **kwargs):
+    if not created:
+        revoke_user(instance.id)
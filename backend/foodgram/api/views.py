@@ -1,19 +1,40 @@
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib import auth
-from django.db.models import Sum
-from django.http import FileResponse, HttpResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from foods.models import (Favorite, Follow, Ingredient, IngredientsAmount,
-                          PurchaseList, Recipe, Tag)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django_filters.rest_framework import DjangoFilterBackend
+from foods import (ingredient_index, membership_cache, recipe_lists,
+                   reference_cache)
+from foods.feed import Feed
+from foods.models import Follow, Ingredient, PurchaseList, Recipe, Tag
+from foods.search import search_by_name, trigram_search_enabled
 from knox.auth import AuthToken
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action, api_view
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .authentication import revoke_user
+from .filters import RecipeFilter
+from .fragments import serialize_recipes
+from .pagination import FeedPagination, RecipePagination
 from .serializers import (ChangePasswordSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeListRetrieveSerializer,
-                          RecipePostUpdateSerializer, RecipePurchaseSerializer,
-                          TagSerializer, UserLoginSerializers, UserSerializer)
+                          IngredientSerializer, RecipeIdsSerializer,
+                          RecipeImageSerializer, RecipeListRetrieveSerializer,
+                          RecipeListSerializer, RecipePostUpdateSerializer,
+                          RecipePurchaseSerializer, TagSerializer,
+                          UserLoginSerializers, UserSerializer,
+                          get_recipes_limit)
+from .shopping_cart import RENDERERS, get_shopping_cart_ingredients
 
 User = auth.get_user_model()
 
@@ -22,9 +43,7 @@ User = auth.get_user_model()
 def login_api(request):
     serializer = UserLoginSerializers(data=request.data)
     serializer.is_valid(raise_exception=True)
-    email = serializer.validated_data['email']
-    user = get_object_or_404(User, email=email)
-    _, token = AuthToken.objects.create(user)
+    _, token = AuthToken.objects.create(serializer.validated_data['user'])
 
     return Response({
         'auth_token': token
@@ -59,8 +78,12 @@ class ChangePasswordViewSet(viewsets.ModelViewSet):
         if not auth.authenticate(username=user.username, password=password):
             return Response({"current_password": ["Wrong password."]},
                             status=status.HTTP_400_BAD_REQUEST)
-        user.set_password(password)
-        user.save()
+        user.set_password(serializer.validated_data.get("new_password"))
+        with transaction.atomic():
+            user.save()
+            # Старые токены перестают действовать и в БД, и в кэше
+            user.auth_token_set.all().delete()
+        revoke_user(user.id)
         return HttpResponse(status=204)
 
 
@@ -75,126 +98,284 @@ class SetPermissionsFiltersSearchFields(
     lookup_field = 'slug'
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class ReferenceCacheMixin:
+    """Кэширует отрендеренные ответы справочника под его версией.
+
+    Версия меняется сигналами при записи в модель и командой import_data,
+    от нее же считаются ETag и Last-Modified, поэтому клиенты и nginx
+    могут получать 304 Not Modified без обращения к БД.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(ReferenceCacheMixin, self).list(
+                request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(ReferenceCacheMixin, self).retrieve(
+                request, *args, **kwargs)
+        )
+
+    def cached_response(self, request, get_response):
+        version = reference_cache.get_version(self.cache_namespace)
+        digest = hashlib.md5(
+            request.get_full_path().encode()
+        ).hexdigest()
+        etag = quote_etag(f'{self.cache_namespace}-{version}-{digest}')
+        last_modified = version // 1000
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            key = f'reference:{self.cache_namespace}:{version}:{digest}'
+            content = cache.get(key)
+            if content is None:
+                response = get_response()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = JSONRenderer().render(response.data)
+                cache.set(key, content, settings.REFERENCE_CACHE_TIMEOUT)
+            response = HttpResponse(
+                content, content_type='application/json'
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+
+class TagViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_namespace = reference_cache.TAGS
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
+    cache_namespace = reference_cache.INGREDIENTS
 
     def get_queryset(self):
         name = self.request.query_params.get('name')
         if name:
-            search_queryset = list(
-                self.queryset.filter(name__istartswith=name)
-            )
-            count_queryset = self.queryset.filter(name__contains=name)
-            search_queryset.extend(
-                [i for i in count_queryset if i not in search_queryset]
-            )
-            self.queryset = search_queryset
+            return search_by_name(self.queryset, name)
         return self.queryset
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: self.search(
+            request, *args, **kwargs))
+
+    def search(self, request, *args, **kwargs):
+        # Автодополнение обслуживается индексом в памяти процесса,
+        # а если он ничего не нашел — нечетким поиском в PostgreSQL
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_SEARCH_BACKEND == 'memory':
+            ingredients = ingredient_index.search(name)
+            if ingredients or not trigram_search_enabled():
+                return Response(ingredients)
+        return super(ReferenceCacheMixin, self).list(
+            request, *args, **kwargs)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
+    pagination_class = RecipePagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = RecipeFilter
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action == 'list':
+            return RecipeListSerializer
+        if self.action == 'retrieve':
             return RecipeListRetrieveSerializer
         return RecipePostUpdateSerializer
 
-    def paginate_queryset(self, queryset):
-        if self.paginator is not None:
-            self.paginator.page_size_query_param = 'limit'
-        return super(RecipeViewSet, self).paginate_queryset(queryset)
-
     def get_queryset(self):
-        tags = self.request.query_params.getlist('tags')
-        if tags:
-            self.queryset = self.queryset.filter(
-                tags__slug__in=tags).distinct()
-
-        author = self.request.query_params.get('author')
-        if author:
-            self.queryset = self.queryset.filter(author=author)
+        # Список и карточка берут тэги, автора и ингредиенты из кэша
+        # фрагментов и подгружают их только для промахов
+        if self.action in ('list', 'retrieve'):
+            return self.queryset
+        return self.queryset.with_related()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(serialize_recipes(
+            page, RecipeListSerializer, self.get_serializer_context()
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        data, = serialize_recipes(
+            [self.get_object()], RecipeListRetrieveSerializer,
+            self.get_serializer_context(),
+        )
+        return Response(data)
 
-        # Следующие фильтры только для авторизованного пользователя
-        user = self.request.user
-        if not user.is_anonymous:
-            true_condition = ['1', 'true']
-            is_in_shopping = self.request.query_params.get(
-                'is_in_shopping_cart'
-            )
+    @action(
+        methods=('POST',),
+        url_path='bulk',
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-            if is_in_shopping is not None:
-                self.queryset = self.queryset.filter(
-                    recipe_cart__isnull=is_in_shopping not in true_condition,
-                    recipe_cart__user=self.request.user
-                )
+    @action(
+        methods=('PUT',),
+        url_path='image',
+        detail=True,
+        permission_classes=(IsAuthenticated,),
+        parser_classes=(MultiPartParser,),
+    )
+    def image(self, request, pk):
+        recipe = self.get_object()
+        if recipe.author_id != request.user.id:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        serializer = RecipeImageSerializer(recipe, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(RecipeListRetrieveSerializer(
+            recipe, context=self.get_serializer_context()
+        ).data)
 
-            is_favorited = self.request.query_params.get('is_favorited')
-            if is_favorited is not None:
-                self.queryset = self.queryset.filter(
-                    favorite__isnull=is_favorited not in true_condition,
-                    favorite__user=self.request.user
-                )
+    @action(
+        methods=('GET',),
+        url_path='feed',
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        paginator = FeedPagination()
+        recipes = paginator.paginate_queryset(
+            Feed(request.user), request, self
+        )
+        return paginator.get_paginated_response(serialize_recipes(
+            recipes, RecipeListSerializer, self.get_serializer_context()
+        ))
 
-        return self.queryset
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= у выгрузки корзины выбирает формат файла, а не рендерер DRF
+        if self.action == 'download_shopping_cart':
+            force = True
+        return super().perform_content_negotiation(request, force)
 
     @action(
         methods=('GET',),
         url_path='download_shopping_cart',
         detail=False,
+        permission_classes=(IsAuthenticated,),
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        bubbba = IngredientsAmount.objects.filter(
-            recipe__recipe_cart__user=user).values(
-            'recipe__ingredients__name').annotate(
-            purchase_amount=Sum('amount'))
-        return FileResponse(
-            bubbba,
-            content_type="text/plain",
-            as_attachment=True,
-            filename="purchase_list.txt",
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in RENDERERS:
+            return Response(
+                {'format': [f'Доступные форматы: {", ".join(RENDERERS)}.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        render, content_type = RENDERERS[file_format]
+        response = StreamingHttpResponse(
+            render(get_shopping_cart_ingredients(request.user).iterator()),
+            content_type=content_type,
         )
+        response['Content-Disposition'] = (
+            f'attachment; filename="purchase_list.{file_format}"'
+        )
+        return response
+
+    @action(
+        methods=('GET',),
+        url_path='shopping_cart_summary',
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_summary(self, request):
+        return Response([
+            {
+                'id': row['ingredient_id'],
+                'name': row['ingredient__name'],
+                'measurement_unit': row['ingredient__measurement_unit'],
+                'amount': row['amount'],
+            }
+            for row in get_shopping_cart_ingredients(request.user)
+        ])
 
     @action(
         methods=('POST', 'DELETE'),
         detail=True
     )
     def favorite(self, request, pk):
-        user = request.user
-        favorite_data = {'user': user, 'recipe_id': pk}
-        try:
-            favorite = Favorite.objects.get(**favorite_data)
-            favorite.delete()
-        except Exception:
-            favorite = Favorite(**favorite_data)
-            favorite.save()
-
+        # POST добавляет, DELETE убирает; повтор запроса ничего не меняет
+        recipe = get_object_or_404(Recipe, id=pk)
+        if request.method == 'POST':
+            recipe_lists.add(
+                request.user.id, membership_cache.FAVORITES, [recipe.id]
+            )
+        else:
+            recipe_lists.remove(
+                request.user.id, membership_cache.FAVORITES, [recipe.id]
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def change_list(self, request, kind):
+        """PUT добавляет рецепты из тела запроса в список, DELETE убирает.
+
+        Повторный запрос не меняет результат; в ответе — id рецептов,
+        состав списка для которых действительно изменился.
+        """
+        adding = request.method == 'PUT'
+        serializer = RecipeIdsSerializer(
+            data=request.data, context={'check_exists': adding}
+        )
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        if adding:
+            added = recipe_lists.add(request.user.id, kind, recipes)
+            return Response({'recipes': recipes, 'added': added})
+        removed = recipe_lists.remove(request.user.id, kind, recipes)
+        return Response({'recipes': recipes, 'removed': removed})
+
+    @action(
+        methods=('PUT', 'DELETE'),
+        url_path='shopping_cart',
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request):
+        return self.change_list(request, membership_cache.CART)
+
+    @action(
+        methods=('PUT', 'DELETE'),
+        url_path='favorite',
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request):
+        return self.change_list(request, membership_cache.FAVORITES)
+
 
 class CartAndFavoritesMixin:
     def create(self, request, **kwargs):
         recipe_id = kwargs.get('recipe_id')
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        PurchaseList.objects.create(user=request.user, recipe=recipe)
+        recipe_lists.add(request.user.id, membership_cache.CART, [recipe.id])
         data = self.serializer_class(recipe).data
         return Response(data, status=status.HTTP_200_OK)
 
     def delete(self, request, **kwargs):
         recipe_id = kwargs.get('recipe_id')
-        user = request.user
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        cart = PurchaseList.objects.filter(user=user, recipe=recipe)
-        cart.delete()
+        recipe_lists.remove(
+            request.user.id, membership_cache.CART, [recipe.id]
+        )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -213,7 +394,9 @@ class FollowViewSet(viewsets.ModelViewSet):
         user_id = kwargs.get('user_id')
         author = get_object_or_404(User, id=user_id)
         user = request.user
-        Follow.objects.create(user=user, author=author)
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+        membership_cache.invalidate(user.id)
         data = self.serializer_class(
             author,
             context={'request': request},
@@ -229,7 +412,34 @@ class FollowViewSet(viewsets.ModelViewSet):
         author = get_object_or_404(User, id=user_id)
         follower = Follow.objects.filter(user=user, author=author)
         follower.delete()
+        membership_cache.invalidate(user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        user = self.request.user
+        return self.queryset.filter(user=user).select_related(
+            'author'
+        ).order_by('id')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        follows = page if page is not None else list(queryset)
+
+        # Рецепты всех авторов страницы одним запросом с ROW_NUMBER()
+        author_recipes = defaultdict(list)
+        recipes = Recipe.objects.filter(
+            author_id__in=[
+                follow.author_id for follow in follows
+                if follow.author_id != request.user.id
+            ]
+        ).latest_per_author(get_recipes_limit(request))
+        for recipe in recipes:
+            author_recipes[recipe.author_id].append(recipe)
+        for follow in follows:
+            follow.author_recipes = author_recipes[follow.author_id]
+
+        serializer = self.get_serializer(follows, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
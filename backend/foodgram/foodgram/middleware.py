@@ -0,0 +1,268 @@
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpResponse
+from rest_framework import serializers
+from rest_framework.response import Response
+
+logger = logging.getLogger('foodgram.nplusone')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('request_stats', default=None)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUE_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,?)+\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def sql_shape(sql):
+    """SQL без значений: запросы, отличающиеся только параметрами,
+    получают одинаковую форму."""
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = VALUE_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def query_origin():
+    """Метод сериализатора (или код проекта), из которого пришел запрос."""
+    frame = sys._getframe(2)
+    project_frame = None
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if isinstance(owner, serializers.BaseSerializer):
+            name = frame.f_code.co_name
+            # Вложенный сериализатор называется полем родителя
+            if name.startswith('get_') and name != 'get_attribute':
+                return f'{type(owner).__name__}.{name}'
+            if owner.parent is not None and owner.field_name:
+                return f'{type(owner.parent).__name__}.{owner.field_name}'
+            return f'{type(owner).__name__}.{name}'
+        if (
+            project_frame is None
+            and frame.f_code.co_filename.startswith(settings.BASE_DIR)
+            and frame.f_code.co_filename != __file__
+        ):
+            project_frame = frame
+        frame = frame.f_back
+    if project_frame is None:
+        return 'unknown'
+    return (
+        f'{project_frame.f_code.co_filename}:{project_frame.f_lineno} '
+        f'{project_frame.f_code.co_name}'
+    )
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.shapes = Counter()
+        self.repeated = 0
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            shape = sql_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == settings.N_PLUS_ONE_THRESHOLD + 1:
+                self.repeated += 1
+                logger.warning(
+                    'N+1: запрос выполнен больше %s раз в %s: %s',
+                    settings.N_PLUS_ONE_THRESHOLD, query_origin(), shape,
+                )
+
+
+def timed(metric, getter):
+    """Оборачивает свойство: время внешнего вызова прибавляется к metric
+    текущего запроса, вложенные вызовы не учитываются повторно."""
+    def wrapper(instance):
+        stats = _current.get()
+        if stats is None or stats.depth:
+            return getter(instance)
+        stats.depth += 1
+        started = time.perf_counter()
+        try:
+            return getter(instance)
+        finally:
+            stats.depth -= 1
+            setattr(
+                stats, metric,
+                getattr(stats, metric) + time.perf_counter() - started
+            )
+    wrapper.instrumented = True
+    return property(wrapper)
+
+
+def instrument_drf():
+    # Время сериализации — обращение к .data, время рендера —
+    # к Response.rendered_content
+    for cls, name, metric in (
+        (serializers.Serializer, 'data', 'serializer_time'),
+        (serializers.ListSerializer, 'data', 'serializer_time'),
+        (Response, 'rendered_content', 'render_time'),
+    ):
+        prop = cls.__dict__[name]
+        if not getattr(prop.fget, 'instrumented', False):
+            setattr(cls, name, timed(metric, prop.fget))
+
+
+class Metrics:
+    """Сводка по маршрутам в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.totals = defaultdict(Counter)
+        self.buckets = defaultdict(Counter)
+
+    def observe(self, route, method, status, duration, stats):
+        key = (route, method)
+        with self.lock:
+            self.requests[(route, method, status)] += 1
+            totals = self.totals[key]
+            totals['duration'] += duration
+            totals['count'] += 1
+            totals['queries'] += stats.queries
+            totals['sql'] += stats.sql_time
+            totals['serializer'] += stats.serializer_time
+            totals['render'] += stats.render_time
+            totals['n_plus_one'] += stats.repeated
+            for bound in DURATION_BUCKETS:
+                if duration <= bound:
+                    self.buckets[key][bound] += 1
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, description):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            metric('foodgram_requests_total', 'counter', 'Запросы')
+            for (route, method, status), value in sorted(
+                    self.requests.items()):
+                lines.append(
+                    f'foodgram_requests_total{{route="{route}",'
+                    f'method="{method}",status="{status}"}} {value}'
+                )
+            metric('foodgram_request_duration_seconds', 'histogram',
+                   'Время обработки запроса')
+            for (route, method), totals in sorted(self.totals.items()):
+                labels = f'route="{route}",method="{method}"'
+                for bound in DURATION_BUCKETS:
+                    lines.append(
+                        'foodgram_request_duration_seconds_bucket'
+                        f'{{{labels},le="{bound}"}} '
+                        f'{self.buckets[(route, method)][bound]}'
+                    )
+                lines.append(
+                    'foodgram_request_duration_seconds_bucket'
+                    f'{{{labels},le="+Inf"}} {totals["count"]}'
+                )
+                lines.append(
+                    f'foodgram_request_duration_seconds_sum{{{labels}}} '
+                    f'{totals["duration"]:.6f}'
+                )
+                lines.append(
+                    f'foodgram_request_duration_seconds_count{{{labels}}} '
+                    f'{totals["count"]}'
+                )
+            for name, field, kind, description in (
+                ('foodgram_db_queries_total', 'queries', 'counter',
+                 'SQL-запросы'),
+                ('foodgram_db_seconds_total', 'sql', 'counter',
+                 'Время SQL'),
+                ('foodgram_serializer_seconds_total', 'serializer',
+                 'counter', 'Время сериализации'),
+                ('foodgram_render_seconds_total', 'render', 'counter',
+                 'Время рендера ответа'),
+                ('foodgram_n_plus_one_total', 'n_plus_one', 'counter',
+                 'Повторяющиеся формы SQL сверх порога'),
+            ):
+                metric(name, kind, description)
+                for (route, method), totals in sorted(self.totals.items()):
+                    lines.append(
+                        f'{name}{{route="{route}",method="{method}"}} '
+                        f'{totals[field]:g}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def metrics_view(request):
+    """Сводка для сотрудников и адресов из METRICS_ALLOWED_IPS."""
+    if not settings.REQUEST_INSTRUMENTATION:
+        raise Http404
+    if not (
+        request.user.is_staff
+        or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    ):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
+
+
+class InstrumentationMiddleware:
+    """Замеряет SQL, сериализацию и рендер каждого запроса.
+
+    Значения уходят клиенту в заголовке Server-Timing и копятся по
+    маршрутам для /metrics. Метрики живут в памяти процесса: у каждого
+    воркера gunicorn своя сводка. При REQUEST_INSTRUMENTATION = False
+    middleware отключается, а DRF не меняется.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument_drf()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.sql_time * 1000:.2f};'
+            f'desc="{stats.queries} queries"',
+            f'serialize;dur={stats.serializer_time * 1000:.2f}',
+            f'render;dur={stats.render_time * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ))
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        metrics.observe(
+            route, request.method, response.status_code, duration, stats
+        )
+        return response
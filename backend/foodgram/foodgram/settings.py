@@ -16,6 +16,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # VENDOR
     'rest_framework',
     'knox',
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +77,56 @@ DATABASES = {
    }
 }
 
+CACHES = {
+    # Здесь же версии фрагментов — по ключу на рецепт и автора, поэтому
+    # ключей должно помещаться не меньше, чем фрагментов, с запасом
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'MAX_ENTRIES': 30000,
+        },
+    },
+    # Избранное, корзина и подписки пользователей, вытеснение по LRU
+    'membership': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'membership',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Проверенные токены knox
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Общая для всех пользователей часть сериализованных рецептов
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Проверять постоянное соединение с БД перед обработкой запроса, если
+# оно простаивало дольше CONN_HEALTH_CHECK_INTERVAL секунд
+CONN_HEALTH_CHECKS = False
+CONN_HEALTH_CHECK_INTERVAL = 30
+
+MEMBERSHIP_CACHE_ALIAS = 'membership'
+
+RECIPE_FRAGMENT_CACHE_ALIAS = 'fragments'
+
+AUTH_TOKEN_CACHE_ALIAS = 'auth'
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -106,8 +158,47 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# memory — индекс ингредиентов в памяти процесса, database — поиск в БД
+INGREDIENT_SEARCH_BACKEND = os.getenv(
+    'INGREDIENT_SEARCH_BACKEND', default='memory'
+)
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Размеры превью рецептов (по большей стороне) и размер для списка
+RECIPE_IMAGE_SIZES = (360, 720)
+RECIPE_LIST_IMAGE_SIZE = 720
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# С какого числа подписчиков рецепты автора раскладываются по лентам
+# при публикации, и сколько последних рецептов добавить новому подписчику
+FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', default=10000))
+FEED_BACKFILL_SIZE = 100
+
+# Сколько раз одна форма SQL может выполниться за запрос до записи в лог
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', default=10))
+
+# Замеры SQL, сериализации и рендера: Server-Timing, /metrics и поиск N+1.
+# В settings_production по умолчанию выключены
+REQUEST_INSTRUMENTATION = os.getenv(
+    'REQUEST_INSTRUMENTATION', default='True'
+).lower() in ('1', 'true', 'yes')
+
+# Адреса, с которых /metrics доступен без входа (сборщик метрик).
+# Сотрудникам (is_staff) он доступен всегда
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.getenv('METRICS_ALLOWED_IPS', default='127.0.0.1')
+    .split(',') if ip
+]
+
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('knox.auth.TokenAuthentication', ),
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'api.authentication.CachedTokenAuthentication',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
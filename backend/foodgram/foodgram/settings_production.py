@@ -0,0 +1,34 @@
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES, DATABASES
+
+DEBUG = os.getenv('DEBUG', default='False').lower() in ('1', 'true', 'yes')
+
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', default='*').split(',')
+
+# Постоянные соединения с БД: перед первым запросом после простоя
+# соединение проверяется и при необходимости открывается заново
+DATABASES['default']['CONN_MAX_AGE'] = int(
+    os.getenv('CONN_MAX_AGE', default=600)
+)
+CONN_HEALTH_CHECKS = True
+
+# Замеры подменяют свойства классов DRF и добавляют работу в каждый
+# запрос, поэтому в продакшене включаются явно
+REQUEST_INSTRUMENTATION = os.getenv(
+    'REQUEST_INSTRUMENTATION', default='False'
+).lower() in ('1', 'true', 'yes')
+
+# Кэши общие для всех воркеров: версии справочников, наборы избранного
+# и отозванные токены должны быть видны каждому процессу
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', default='memcached:11211')
+CACHES = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': CACHE_LOCATION,
+        'KEY_PREFIX': alias,
+        'TIMEOUT': options.get('TIMEOUT', 300),
+    }
+    for alias, options in CACHES.items()
+}
@@ -0,0 +1,65 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.test import RequestFactory
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+# Справочники и первая страница рецептов: заполняют общий кэш ответов
+# и прогревают код сериализаторов
+WARMUP_PATHS = ('/api/tags/', '/api/ingredients/', '/api/recipes/')
+
+
+def warm_up():
+    """Готовит процесс к первым запросам: индекс ингредиентов, кэш
+    справочников, соединение с БД."""
+    from foods import ingredient_index
+
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*']
+    factory = RequestFactory(
+        HTTP_HOST=hosts[0].lstrip('.') if hosts else 'localhost'
+    )
+    try:
+        ingredient_index.get_index()
+        for path in WARMUP_PATHS:
+            match = resolve(path)
+            response = match.func(
+                factory.get(path), *match.args, **match.kwargs
+            )
+            if hasattr(response, 'render'):
+                response.render()
+    except DatabaseError:
+        logger.warning('Прогрев пропущен: база данных недоступна')
+    except Exception:
+        # Неудачный прогрев не должен мешать воркеру стартовать
+        logger.exception('Ошибка прогрева')
+
+
+def close_unusable_connections(**kwargs):
+    """Закрывает постоянные соединения, которые перестали отвечать.
+
+    Django 2.2 проверяет соединение только после ошибки, поэтому первый
+    запрос после перезапуска PostgreSQL иначе падал бы в каждом воркере.
+    Проверка стоит лишнего SELECT 1, поэтому делается только после простоя
+    дольше CONN_HEALTH_CHECK_INTERVAL: под нагрузкой соединение только
+    что отработало предыдущий запрос.
+    """
+    checked_before = time.monotonic() - settings.CONN_HEALTH_CHECK_INTERVAL
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        if getattr(connection, 'last_used_at', 0) > checked_before:
+            continue
+        if not connection.is_usable():
+            connection.close()
+
+
+def mark_connections_used(**kwargs):
+    """Запоминает время последнего запроса для close_unusable_connections."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.last_used_at = now
@@ -1,7 +1,16 @@
 import os
 
+from django.conf import settings
+from django.core.signals import request_finished, request_started
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+from .warmup import close_unusable_connections  # noqa: E402
+from .warmup import mark_connections_used  # noqa: E402
+
+if settings.CONN_HEALTH_CHECKS:
+    request_started.connect(close_unusable_connections)
+    request_finished.connect(mark_connections_used)
@@ -10,12 +10,28 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'email',
+        'recipes_count',
+        'followers_count',
     )
     search_fields = ('username',)
     empty_value_display = '-пусто-'
 
 
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+    list_display = (
+        'name',
+        'author',
+        'pub_date',
+        'favorites_count',
+        'in_carts_count',
+    )
+    list_select_related = ('author',)
+    search_fields = ('name',)
+    readonly_fields = ('favorites_count', 'in_carts_count')
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Ingredient)
 admin.site.register(Tag)
-admin.site.register(Recipe)
 admin.site.register(IngredientsAmount)
@@ -0,0 +1,40 @@
+from django.apps import apps as global_apps
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# Счетчик: (модель строк, поле-ссылка, модель со счетчиком, поле счетчика)
+COUNTERS = (
+    ('Favorite', 'recipe_id', 'Recipe', 'favorites_count'),
+    ('PurchaseList', 'recipe_id', 'Recipe', 'in_carts_count'),
+    ('Recipe', 'author_id', 'User', 'recipes_count'),
+    ('Follow', 'author_id', 'User', 'followers_count'),
+)
+
+
+def change(model, pk, field, delta):
+    """Атомарно меняет счетчик в БД, не опуская его ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def recount(apps=global_apps):
+    """Пересчитывает все счетчики по исходным таблицам.
+
+    Возвращает число исправленных строк для каждого счетчика.
+    """
+    fixed = {}
+    for source_name, link, target_name, field in COUNTERS:
+        source = apps.get_model('foods', source_name)
+        target = apps.get_model('foods', target_name)
+        actual = Coalesce(Subquery(
+            source.objects.filter(**{link: OuterRef('pk')}).order_by()
+            .values(link).annotate(total=Count('pk')).values('total')
+        ), Value(0))
+        drifted = target.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        ).values_list('pk', flat=True)
+        fixed[f'{target_name}.{field}'] = target.objects.filter(
+            pk__in=list(drifted)
+        ).update(**{field: actual})
+    return fixed
@@ -0,0 +1,194 @@
+from datetime import datetime
+from heapq import merge
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import FeedItem, Follow, Recipe, User
+
+# Горизонт подписки, для которой в FeedItem разложены все рецепты автора
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def fanout_threshold():
+    return settings.FEED_FANOUT_THRESHOLD
+
+
+def keyset(queryset, date_field, id_field, cursor, reverse):
+    """Строки после позиции курсора в порядке ленты (или обратном)."""
+    if cursor:
+        pub_date, pk = cursor['p'], cursor['i']
+        lookup = 'gt' if reverse else 'lt'
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk})
+        )
+    if reverse:
+        return queryset.order_by(date_field, id_field)
+    return queryset.order_by(f'-{date_field}', f'-{id_field}')
+
+
+class Feed:
+    """Лента рецептов авторов, на которых подписан пользователь.
+
+    Подписка с горизонтом h получает рецепты автора с pub_date >= h
+    из FeedItem, заполненной при публикации, а более старые — из Recipe
+    по индексу (author, -pub_date). Подписки без горизонта (обычные
+    авторы и еще не разложенные ленты) целиком читаются из Recipe.
+    Каждая ветка отдает не больше limit строк, результат сливается.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def read_side(self):
+        # Условия в одном filter() относятся к одной строке Follow
+        return Recipe.objects.filter(
+            Q(author__following__feed_horizon__isnull=True)
+            | Q(pub_date__lt=F('author__following__feed_horizon')),
+            author__following__user=self.user,
+        )
+
+    def write_side(self):
+        # Записи, оставшиеся от удаленной и снова созданной подписки,
+        # отсекаются горизонтом текущей
+        return FeedItem.objects.filter(
+            user=self.user,
+            recipe__author__following__user=self.user,
+            pub_date__gte=F('recipe__author__following__feed_horizon'),
+        )
+
+    def count(self):
+        return self.read_side().count() + self.write_side().count()
+
+    def page(self, cursor, reverse, limit):
+        """limit рецептов после курсора, в порядке (pub_date, id)."""
+        branches = (
+            keyset(self.read_side(), 'pub_date', 'id', cursor, reverse)
+            .values_list('pub_date', 'id')[:limit],
+            keyset(self.write_side(), 'pub_date', 'recipe_id', cursor,
+                   reverse)
+            .values_list('pub_date', 'recipe_id')[:limit],
+        )
+        keys = list(merge(*branches, reverse=not reverse))[:limit]
+        recipes = Recipe.objects.in_bulk([pk for _, pk in keys])
+        return [recipes[pk] for _, pk in keys if pk in recipes]
+
+
+def insert_select(select, params):
+    """INSERT INTO FeedItem ... SELECT, пропуская уже записанные строки."""
+    table = connection.ops.quote_name(FeedItem._meta.db_table)
+    sql = (
+        f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+        f'{table} (user_id, recipe_id, pub_date) {select} '
+        f'{connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def tables():
+    return {
+        model.__name__.lower(): connection.ops.quote_name(
+            model._meta.db_table
+        )
+        for model in (Follow, Recipe, User)
+    }
+
+
+def publish(recipe_ids):
+    """Раскладывает новые рецепты по лентам подписок с горизонтом
+    одним INSERT ... SELECT на стороне БД."""
+    if not recipe_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    return insert_select(
+        'SELECT f.user_id, r.id, r.pub_date FROM {recipe} r '
+        'JOIN {follow} f ON f.author_id = r.author_id '
+        f'WHERE r.id IN ({placeholders}) AND f.feed_horizon IS NOT NULL'
+        .format(**tables()),
+        list(recipe_ids),
+    )
+
+
+def horizon(author_id):
+    """Дата самого старого из FEED_BACKFILL_SIZE последних рецептов автора
+    или EPOCH, если рецептов не больше FEED_BACKFILL_SIZE."""
+    size = settings.FEED_BACKFILL_SIZE
+    dates = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pub_date', flat=True)[size - 1:size]
+    return next(iter(dates), EPOCH)
+
+
+def backfill(author_id, user_id=None, pending=False):
+    """Заново собирает ленты подписчиков автора (одного подписчика или
+    только еще не разложенные) из последних FEED_BACKFILL_SIZE рецептов.
+    Горизонт подписки запоминается, более старые рецепты отдает
+    Feed.read_side."""
+    follows = Follow.objects.filter(author_id=author_id)
+    if user_id is not None:
+        follows = follows.filter(user_id=user_id)
+    if pending:
+        follows = follows.filter(feed_horizon__isnull=True)
+    user_ids = list(follows.values_list('user_id', flat=True))
+    if not user_ids:
+        return 0
+    follows = Follow.objects.filter(author_id=author_id, user_id__in=user_ids)
+    # Записи, оставшиеся с прошлого раза, когда автор был большим, могли
+    # отстать от горизонта
+    FeedItem.objects.filter(
+        user_id__in=user_ids, recipe__author_id=author_id
+    ).delete()
+    follows.update(feed_horizon=horizon(author_id))
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    return insert_select(
+        'SELECT f.user_id, r.id, r.pub_date FROM {follow} f '
+        'JOIN {recipe} r ON r.author_id = f.author_id '
+        'WHERE f.author_id = %s AND r.pub_date >= f.feed_horizon '
+        f'AND f.user_id IN ({placeholders})'.format(**tables()),
+        [author_id, *user_ids],
+    )
+
+
+def follow(user_id, author_id):
+    """Раскладывает ленту нового подписчика большого автора: не больше
+    FEED_BACKFILL_SIZE строк. Ленты остальных подписчиков, если автор
+    только что стал большим, раскладывает backfill_pending; до этого
+    их целиком отдает Feed.read_side."""
+    followers = User.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+    if followers >= fanout_threshold():
+        backfill(author_id, user_id)
+
+
+def unfollow(user_id, author_id):
+    FeedItem.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def big_authors():
+    return User.objects.filter(
+        followers_count__gte=fanout_threshold()
+    ).values_list('pk', flat=True)
+
+
+def backfill_pending():
+    """Раскладывает ленты подписок больших авторов, у которых еще
+    нет горизонта."""
+    authors = big_authors().filter(
+        following__feed_horizon__isnull=True
+    ).distinct()
+    return sum(backfill(author, pending=True) for author in authors)
+
+
+def rebuild():
+    """Собирает FeedItem заново для всех больших авторов."""
+    Follow.objects.exclude(feed_horizon=None).update(feed_horizon=None)
+    FeedItem.objects.all().delete()
+    return sum(backfill(author) for author in big_authors())
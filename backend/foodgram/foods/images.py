@@ -0,0 +1,96 @@
+import hashlib
+import io
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+UPLOAD_DIR = 'foods/'
+THUMBNAIL_DIR = 'foods/thumbnails/'
+WEBP = 'webp'
+HASHED_NAME = re.compile(r'^foods/(?P<digest>[0-9a-f]{64})\.(?P<ext>\w+)$')
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': WEBP}
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def thumbnail_name(image_name, size, extension=None):
+    """Имя превью для изображения, сохраненного store_image.
+
+    Для старых файлов без хэша в имени превью нет — возвращается None.
+    """
+    match = HASHED_NAME.match(image_name or '')
+    if match is None:
+        return None
+    extension = extension or match.group('ext')
+    return f'{THUMBNAIL_DIR}{match.group("digest")}_{size}.{extension}'
+
+
+def image_extension(file):
+    """Расширение по формату, который определил Pillow, а не по имени
+    файла от клиента."""
+    file.seek(0)
+    try:
+        image_format = Image.open(file).format
+    finally:
+        file.seek(0)
+    return EXTENSIONS.get(image_format, image_format.lower())
+
+
+def save_unique(name, content):
+    """Записывает файл под именем из хэша содержимого.
+
+    Если параллельный запрос успел записать тот же файл первым, storage
+    сохранит копию под другим именем — она удаляется, остается name
+    с тем же содержимым.
+    """
+    saved = default_storage.save(name, content)
+    if saved != name:
+        default_storage.delete(saved)
+    return name
+
+
+def make_thumbnails(name):
+    """Уменьшенные копии всех размеров в исходном формате и в WebP."""
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    image_format = image.format
+    for size in settings.RECIPE_IMAGE_SIZES:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+        for extension, save_format in (
+            (None, image_format),
+            (WEBP, 'WEBP'),
+        ):
+            target = thumbnail_name(name, size, extension)
+            if default_storage.exists(target):
+                continue
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, format=save_format)
+            save_unique(target, ContentFile(buffer.getvalue()))
+
+
+def store_image(image):
+    """Сохраняет загруженное изображение под именем из его sha256.
+
+    Одинаковые файлы хранятся один раз: если такой уже есть, повторно
+    он не записывается. Превью создаются вместе с оригиналом.
+    """
+    if not image or image._committed:
+        return
+    name = f'{UPLOAD_DIR}{content_hash(image)}.{image_extension(image)}'
+    if not default_storage.exists(name):
+        save_unique(name, image.file)
+        make_thumbnails(name)
+    image.name = name
+    image._committed = True
@@ -0,0 +1,114 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from . import reference_cache
+
+NGRAM_SIZE = 3
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def ngrams(value):
+    return {
+        value[i:i + NGRAM_SIZE]
+        for i in range(len(value) - NGRAM_SIZE + 1)
+    }
+
+
+class IngredientIndex:
+    """Неизменяемый снимок справочника ингредиентов.
+
+    Имена хранятся отсортированным массивом в нормализованном виде:
+    префиксы ищутся бинарным поиском, подстроки — по инвертированному
+    индексу триграмм с последующей проверкой вхождения.
+    """
+
+    def __init__(self, ingredients):
+        entries = sorted(
+            (normalize(name), pk, name, measurement_unit)
+            for pk, name, measurement_unit in ingredients
+        )
+        self.keys = [entry[0] for entry in entries]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in entries
+        ]
+        postings = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            for ngram in ngrams(key):
+                postings[ngram].append(position)
+        self.postings = dict(postings)
+
+    def prefix_positions(self, query):
+        start = bisect_left(self.keys, query)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(query):
+            end += 1
+        return range(start, end)
+
+    def substring_positions(self, query):
+        if len(query) < NGRAM_SIZE:
+            candidates = range(len(self.keys))
+        else:
+            lists = sorted(
+                (self.postings.get(ngram, ()) for ngram in ngrams(query)),
+                key=len,
+            )
+            candidates = set(lists[0]).intersection(*lists[1:])
+            candidates = sorted(candidates)
+        return [
+            position for position in candidates
+            if query in self.keys[position]
+        ]
+
+    def search(self, query):
+        """Сначала совпадения по началу имени, затем по подстроке."""
+        query = normalize(query)
+        prefix = self.prefix_positions(query)
+        result = [self.items[position] for position in prefix]
+        result.extend(
+            self.items[position]
+            for position in self.substring_positions(query)
+            if position not in prefix
+        )
+        return result
+
+    def all(self):
+        return self.items
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def load():
+    from .models import Ingredient
+
+    global _index
+    version = reference_cache.get_version(reference_cache.INGREDIENTS)
+    index = IngredientIndex(
+        Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+    )
+    index.version = version
+    _index = index
+    return index
+
+
+def get_index():
+    # Снимок перестраивается, когда версия справочника в общем кэше
+    # изменилась: сигналами на Ingredient или командой import_data
+    version = reference_cache.get_version(reference_cache.INGREDIENTS)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is not None and _index.version == version:
+            return _index
+        return load()
+
+
+def search(query):
+    return get_index().search(query)
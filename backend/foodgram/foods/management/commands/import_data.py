@@ -1,8 +1,12 @@
+import csv
 import json
 import os
+from itertools import islice
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from foods import reference_cache
 from foods.models import Ingredient, Tag
 
 INGREDIENTS_CSV = 'ingredients.csv'
@@ -10,24 +14,165 @@ INGREDIENTS_JSON = 'ingredients.json'
 TAGS_JSON = 'tags.json'
 
 data_path = settings.BASE_DIR
-path = os.path.join(data_path, INGREDIENTS_JSON)
 
+READ_SIZE = 64 * 1024
 
-class Command(BaseCommand):
-    help = 'Загрузка ингредиентов в БД из файла'
 
-    def handle(self, *args, **options):
-        ingredients_path = os.path.join(data_path, INGREDIENTS_JSON)
-        tags_path = os.path.join(data_path, TAGS_JSON)
+def iter_json_array(file):
+    """Читает объекты из JSON-массива по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: file.read(READ_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item
+        buffer = buffer[position:]
+    if buffer.strip():
+        raise CommandError('JSON-файл оборван')
 
-        def load_model(path, model):
-            model.objects.all().delete()
 
-            with open(path, 'r', encoding='utf-8') as f:
-                model.objects.bulk_create(
-                    objs=[model(**x) for x in json.load(f)],
-                    ignore_conflicts=True
-                )
+def read_records(path, fields):
+    """Записи файла в виде словарей: JSON-массив или CSV без заголовка."""
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith('.csv'):
+            for row in csv.reader(file):
+                if row:
+                    yield dict(zip(fields, (value.strip() for value in row)))
+        else:
+            for item in iter_json_array(file):
+                yield {field: item[field] for field in fields}
+
+
+class Upsert:
+    """Сверяет пачку записей с базой по естественному ключу.
+
+    Новые записи создаются, отличающиеся — обновляются, остальные
+    только учитываются в статистике.
+    """
+
+    def __init__(self, model, key, fields, dry_run, stdout):
+        self.model = model
+        self.key = key
+        self.fields = fields
+        self.values = [field for field in fields if field not in key]
+        self.dry_run = dry_run
+        self.stdout = stdout
+        self.inserted = self.updated = self.unchanged = 0
+
+    def natural_key(self, record):
+        return tuple(record[field] for field in self.key)
+
+    def __call__(self, records):
+        records = {self.natural_key(record): record for record in records}
+        lookup = {
+            f'{self.key[0]}__in': {key[0] for key in records}
+        }
+        existing = {}
+        for obj in self.model.objects.filter(**lookup):
+            existing.setdefault(self.natural_key(vars(obj)), obj)
+
+        created, changed = [], []
+        for key, record in records.items():
+            obj = existing.get(key)
+            if obj is None:
+                created.append(self.model(**record))
+                self.report('+', key, record)
+                continue
+            diff = {
+                field: (getattr(obj, field), record[field])
+                for field in self.values
+                if getattr(obj, field) != record[field]
+            }
+            if not diff:
+                self.unchanged += 1
+                continue
+            for field, (_, value) in diff.items():
+                setattr(obj, field, value)
+            changed.append(obj)
+            self.report('~', key, diff)
 
-        load_model(ingredients_path, Ingredient)
-        load_model(tags_path, Tag)
+        self.inserted += len(created)
+        self.updated += len(changed)
+        if self.dry_run:
+            return
+        self.model.objects.bulk_create(created)
+        if changed:
+            self.model.objects.bulk_update(changed, self.values)
+
+    def report(self, sign, key, details):
+        if self.dry_run:
+            self.stdout.write(f'{sign} {" / ".join(key)}: {details}')
+
+    @property
+    def changed(self):
+        return bool(self.inserted or self.updated)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка ингредиентов и тегов в БД из файлов без удаления '
+        'существующих записей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(data_path, INGREDIENTS_JSON),
+            help=f'{INGREDIENTS_JSON} или {INGREDIENTS_CSV}'
+        )
+        parser.add_argument(
+            '--tags', default=os.path.join(data_path, TAGS_JSON)
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать изменения, ничего не записывая'
+        )
+
+    def handle(self, *args, **options):
+        sources = (
+            (reference_cache.INGREDIENTS, 'Ингредиенты', Ingredient,
+             options['ingredients'], ('name', 'measurement_unit'),
+             ('name', 'measurement_unit')),
+            (reference_cache.TAGS, 'Теги', Tag,
+             options['tags'], ('slug',), ('name', 'slug', 'color')),
+        )
+        with transaction.atomic():
+            for namespace, title, model, path, key, fields in sources:
+                if not os.path.exists(path):
+                    raise CommandError(f'Файл не найден: {path}')
+                upsert = Upsert(
+                    model, key, fields, options['dry_run'], self.stdout
+                )
+                records = read_records(path, fields)
+                while True:
+                    batch = list(islice(records, options['batch_size']))
+                    if not batch:
+                        break
+                    upsert(batch)
+                self.stdout.write(
+                    f'{title}: добавлено {upsert.inserted}, '
+                    f'обновлено {upsert.updated}, '
+                    f'без изменений {upsert.unchanged}'
+                )
+                if upsert.changed and not options['dry_run']:
+                    transaction.on_commit(
+                        lambda namespace=namespace:
+                        reference_cache.bump_version(namespace)
+                    )
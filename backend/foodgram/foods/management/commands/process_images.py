@@ -0,0 +1,28 @@
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from foods.images import make_thumbnails, store_image, thumbnail_name
+from foods.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Переносит фото рецептов в хранилище по хэшу содержимого '
+            'и создает недостающие превью')
+
+    def handle(self, *args, **options):
+        processed = 0
+        for recipe in Recipe.objects.only('id', 'image').iterator():
+            name = recipe.image.name
+            if not name or not default_storage.exists(name):
+                continue
+            if thumbnail_name(name, 0) is None:
+                with default_storage.open(name) as file:
+                    recipe.image = File(file, name=name)
+                    store_image(recipe.image)
+                Recipe.objects.filter(id=recipe.id).update(
+                    image=recipe.image.name
+                )
+            else:
+                make_thumbnails(name)
+            processed += 1
+        self.stdout.write(f'Обработано изображений: {processed}')
@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from foods import feed
+
+
+class Command(BaseCommand):
+    help = 'Собирает заново ленты подписчиков больших авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Разложить только ленты подписок, которые еще не собраны'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['pending']:
+                created = feed.backfill_pending()
+            else:
+                created = feed.rebuild()
+        self.stdout.write(f'Записей ленты: {created}')
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from foods import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Собирает заново списки покупок по корзинам пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, можно указать несколько раз'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = shopping_list.rebuild(options['users'])
+        self.stdout.write(f'Строк списков покупок: {rows}')
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from foods.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики рецептов и авторов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount()
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: исправлено строк — {rows}')
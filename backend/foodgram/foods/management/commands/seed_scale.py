@@ -0,0 +1,297 @@
+import csv
+import io
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from foods import feed, shopping_list
+from foods.counters import recount
+from foods.images import store_image
+from foods.models import (Favorite, Follow, Ingredient, IngredientsAmount,
+                          PurchaseList, Recipe, Tag, User)
+from foods.search import update_search_index
+from PIL import Image
+
+PASSWORD = 'seed-password'
+START = datetime(2021, 1, 1, tzinfo=timezone.utc)
+PERIOD = timedelta(days=365)
+
+ADJECTIVES = (
+    'Домашний', 'Быстрый', 'Пряный', 'Летний', 'Осенний', 'Бабушкин',
+    'Сливочный', 'Острый', 'Постный', 'Праздничный', 'Легкий', 'Сытный',
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'омлет', 'плов', 'рагу', 'соус', 'десерт',
+    'гуляш', 'рулет', 'борщ', 'смузи', 'ризотто', 'запеканка', 'паштет',
+)
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев')
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса степенного распределения для choices()."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+@contextmanager
+def explicit_dates(model):
+    """Отключает auto_now и auto_now_add, чтобы bulk_create записал
+    сгенерированные даты, а не текущее время."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетических пользователей, рецепты, избранное, '
+        'корзины и подписки для нагрузочных проверок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--ingredients', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'),
+            help='Сколько ингредиентов в одном рецепте'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=10,
+            help='Среднее число рецептов в избранном у пользователя'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=3,
+            help='Среднее число рецептов в корзине у пользователя'
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов и рецептов'
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.tag_ids = list(
+            Tag.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not self.ingredient_ids or not self.tag_ids:
+            raise CommandError(
+                'Справочники пусты, сначала выполните import_data'
+            )
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт')
+
+        with transaction.atomic():
+            user_ids = self.create_users(options)
+            recipe_ids = self.create_recipes(user_ids, options)
+            self.create_links(user_ids, recipe_ids, options)
+            self.reset_sequences()
+            recount()
+            update_search_index()
+            self.stdout.write(
+                f'Строк списков покупок: {shopping_list.rebuild()}'
+            )
+            self.stdout.write(f'Записей ленты: {feed.rebuild()}')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def next_id(self, model):
+        return (model.objects.aggregate(value=Max('id'))['value'] or 0) + 1
+
+    def random_date(self):
+        return START + timedelta(
+            seconds=self.rng.randrange(int(PERIOD.total_seconds()))
+        )
+
+    def create_users(self, options):
+        first_id = self.next_id(User)
+        user_ids = range(first_id, first_id + options['users'])
+        password = make_password(PASSWORD, salt=f'seed{options["seed"]}')
+        self.write(User, (
+            'id', 'password', 'is_superuser', 'is_staff', 'is_active',
+            'date_joined', 'email', 'username', 'first_name', 'last_name',
+            'recipes_count', 'followers_count',
+        ), (
+            (
+                pk, password, False, False, True, self.random_date(),
+                f'seed{pk}@example.com', f'seed{pk}',
+                self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES),
+                0, 0,
+            )
+            for pk in user_ids
+        ))
+        # Популярность авторов — по случайной перестановке пользователей
+        self.authors = list(user_ids)
+        self.rng.shuffle(self.authors)
+        self.author_weights = zipf_weights(
+            len(self.authors), options['exponent']
+        )
+        return user_ids
+
+    def create_recipes(self, user_ids, options):
+        first_id = self.next_id(Recipe)
+        recipe_ids = range(first_id, first_id + options['recipes'])
+        image = self.placeholder_image()
+        self.write(Recipe, (
+            'id', 'author', 'name', 'image', 'text', 'pub_date',
+            'cooking_time', 'favorites_count', 'in_carts_count',
+        ), (
+            (
+                pk,
+                self.rng.choices(
+                    self.authors, cum_weights=self.author_weights
+                )[0],
+                f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(DISHES)}',
+                image,
+                f'Рецепт номер {pk}. Смешать, довести до готовности.',
+                self.random_date(),
+                self.rng.randint(5, 180),
+                0, 0,
+            )
+            for pk in recipe_ids
+        ))
+        self.write(Recipe.tags.through, ('recipe', 'tag'), (
+            (pk, tag)
+            for pk in recipe_ids
+            for tag in self.rng.sample(
+                self.tag_ids, self.rng.randint(1, min(3, len(self.tag_ids)))
+            )
+        ))
+        low, high = options['ingredients']
+        high = min(high, len(self.ingredient_ids))
+        self.write(IngredientsAmount, ('recipe', 'ingredients', 'amount'), (
+            (pk, ingredient, self.rng.randint(1, 500))
+            for pk in recipe_ids
+            for ingredient in self.rng.sample(
+                self.ingredient_ids, self.rng.randint(min(low, high), high)
+            )
+        ))
+        return recipe_ids
+
+    def create_links(self, user_ids, recipe_ids, options):
+        recipes = list(recipe_ids)
+        self.rng.shuffle(recipes)
+        recipe_weights = zipf_weights(len(recipes), options['exponent'])
+
+        def pick(population, weights, user, average):
+            count = self.rng.randint(0, 2 * average)
+            chosen = set(self.rng.choices(
+                population, cum_weights=weights, k=count
+            ))
+            chosen.discard(user)
+            return sorted(chosen)
+
+        self.write(Follow, ('user', 'author'), (
+            (user, author)
+            for user in user_ids
+            for author in pick(
+                self.authors, self.author_weights, user, options['follows']
+            )
+        ))
+        for model, average in (
+            (Favorite, options['favorites']),
+            (PurchaseList, options['cart']),
+        ):
+            self.write(model, ('user', 'recipe'), (
+                (user, recipe)
+                for user in user_ids
+                for recipe in pick(recipes, recipe_weights, None, average)
+            ))
+
+    def placeholder_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (720, 480), (230, 180, 120)).save(
+            buffer, format='JPEG'
+        )
+        recipe = Recipe(image=ContentFile(buffer.getvalue(), name='seed.jpg'))
+        store_image(recipe.image)
+        return recipe.image.name
+
+    def write(self, model, fields, rows):
+        """Пишет строки пачками: COPY в PostgreSQL, bulk_create
+        в остальных."""
+        table = model._meta.db_table
+        fields = [model._meta.get_field(field) for field in fields]
+        total = 0
+        with connection.cursor() as cursor, explicit_dates(model):
+            for batch in batched(rows, self.batch_size):
+                if connection.vendor == 'postgresql':
+                    self.copy(
+                        cursor, table, [field.column for field in fields],
+                        batch,
+                    )
+                else:
+                    objs = [
+                        model(**{
+                            field.attname: value
+                            for field, value in zip(fields, row)
+                        })
+                        for row in batch
+                    ]
+                    # В Django 2.2 явный batch_size не ограничивается
+                    # лимитом БД на число параметров запроса
+                    model.objects.bulk_create(objs, batch_size=min(
+                        self.batch_size,
+                        connection.ops.bulk_batch_size(fields, objs),
+                    ))
+                total += len(batch)
+        self.stdout.write(f'{table}: {total}')
+
+    def copy(self, cursor, table, columns, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.cursor.copy_expert(
+            'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                connection.ops.quote_name(table),
+                ', '.join(map(connection.ops.quote_name, columns)),
+            ),
+            buffer,
+        )
+
+    def reset_sequences(self):
+        # id пользователей и рецептов заданы явно, счетчики последовательностей
+        # нужно сдвинуть за них
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
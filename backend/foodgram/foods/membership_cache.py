@@ -0,0 +1,87 @@
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import IntegerField, Value
+
+from .models import Favorite, Follow, PurchaseList
+
+FAVORITES = 'favorites'
+CART = 'cart'
+FOLLOWS = 'follows'
+
+Membership = namedtuple('Membership', (FAVORITES, CART, FOLLOWS))
+EMPTY = Membership(frozenset(), frozenset(), frozenset())
+
+
+def get_cache():
+    return caches[settings.MEMBERSHIP_CACHE_ALIAS]
+
+
+def version_key(user_id):
+    return f'membership:{user_id}:version'
+
+
+def get_version(cache, user_id):
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, uuid.uuid4().hex, timeout=None)
+    return cache.get(key)
+
+
+def cache_key(user_id, version):
+    return f'membership:{user_id}:{version}'
+
+
+def load(user_id):
+    """Избранное, корзина и подписки пользователя одним запросом."""
+    def kind(queryset, index, field):
+        return queryset.filter(user_id=user_id).annotate(
+            kind=Value(index, output_field=IntegerField())
+        ).values_list(field, 'kind')
+
+    rows = kind(Favorite.objects, 0, 'recipe_id').union(
+        kind(PurchaseList.objects, 1, 'recipe_id'),
+        kind(Follow.objects, 2, 'author_id'),
+        all=True,
+    )
+    members = (set(), set(), set())
+    for object_id, index in rows:
+        members[index].add(object_id)
+    return Membership(*map(frozenset, members))
+
+
+def get_membership(user):
+    """Множества id избранных рецептов, рецептов в корзине и авторов,
+    на которых подписан пользователь.
+
+    Хранятся в отдельном кэше, ограниченном LRU-вытеснением
+    (MAX_ENTRIES), под версией пользователя и загружаются из БД только
+    при промахе.
+    """
+    if user is None or user.is_anonymous:
+        return EMPTY
+    cache = get_cache()
+    key = cache_key(user.id, get_version(cache, user.id))
+    membership = cache.get(key)
+    if membership is None:
+        membership = load(user.id)
+        cache.set(key, membership)
+    return membership
+
+
+def invalidate(user_id):
+    """После коммита переводит пользователя на новую версию.
+
+    Множества не правятся на месте: два параллельных запроса потеряли бы
+    одно из изменений. Следующее чтение загрузит их из БД заново, а
+    запрос, успевший прочитать старые данные, запишет их под старой
+    версией, которую уже никто не читает.
+    """
+    transaction.on_commit(lambda: get_cache().set(
+        version_key(user_id), uuid.uuid4().hex, None
+    ))
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+TRIGRAM_INDEXES = (
+    ('foods_ingredient_name_trgm', 'foods_ingredient', 'name'),
+    ('foods_ingredient_name_upper_trgm', 'foods_ingredient',
+     'UPPER(name::text)'),
+    ('foods_recipe_name_trgm', 'foods_recipe', 'name'),
+    ('foods_recipe_name_upper_trgm', 'foods_recipe', 'UPPER(name::text)'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Индексы pg_trgm есть только в PostgreSQL, на sqlite поиск идет LIKE
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin (({expression}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:56
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# Копия foods.counters.COUNTERS на момент миграции: код приложения
+# может измениться, а миграция должна работать с этой схемой
+COUNTERS = (
+    ('Favorite', 'recipe_id', 'Recipe', 'favorites_count'),
+    ('PurchaseList', 'recipe_id', 'Recipe', 'in_carts_count'),
+    ('Recipe', 'author_id', 'User', 'recipes_count'),
+    ('Follow', 'author_id', 'User', 'followers_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for source_name, link, target_name, field in COUNTERS:
+        source = apps.get_model('foods', source_name)
+        target = apps.get_model('foods', target_name)
+        target.objects.using(db_alias).update(**{field: Coalesce(Subquery(
+            source.objects.filter(**{link: OuterRef('pk')}).order_by()
+            .values(link).annotate(total=Count('pk')).values('total')
+        ), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0003_recipe_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:57
+
+from django.db import migrations
+import foods.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', foods.models.UserManager()),
+            ],
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS foods_user_email_lower_idx '
+            'ON foods_user (LOWER(email))',
+            'DROP INDEX IF EXISTS foods_user_email_lower_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS foods_user_username_lower_idx '
+            'ON foods_user (LOWER(username))',
+            'DROP INDEX IF EXISTS foods_user_username_lower_idx',
+        ),
+    ]
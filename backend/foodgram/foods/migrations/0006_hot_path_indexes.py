@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0005_user_login_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name', 'measurement_unit'], name='ingredient_name_unit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredientsamount',
+            index=models.Index(fields=['recipe', 'ingredients', 'amount'], name='amount_recipe_ingredient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_date_idx'),
+        ),
+        # Обратный индекс для автоматической таблицы recipe_tags: фильтр
+        # по тегу идет от tag_id к recipe_id, а уникальный индекс
+        # начинается с recipe_id
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS foods_recipe_tags_tag_recipe_idx '
+            'ON foods_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX IF EXISTS foods_recipe_tags_tag_recipe_idx',
+        ),
+    ]
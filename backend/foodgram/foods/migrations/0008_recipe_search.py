@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:11
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# SQL заморожен в миграции и не зависит от foods.search
+FTS_TABLE = 'foods_recipe_fts'
+INGREDIENT_NAMES = (
+    "(SELECT {agg} FROM foods_ingredientsamount a "
+    "JOIN foods_ingredient i ON i.id = a.ingredients_id "
+    "WHERE a.recipe_id = r.id)"
+)
+
+
+def create_search_index(apps, schema_editor):
+    # В PostgreSQL — GIN-индекс по tsvector, в sqlite — теневая таблица FTS5
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS foods_recipe_search_vector_gin '
+            'ON foods_recipe USING gin (search_vector)'
+        )
+        names = INGREDIENT_NAMES.format(agg="string_agg(i.name, ' ')")
+        schema_editor.execute(
+            'UPDATE foods_recipe r SET search_vector = '
+            "setweight(to_tsvector('russian', coalesce(r.name, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(r.text, '')), 'B') || "
+            f"setweight(to_tsvector('russian', coalesce({names}, '')), 'C')"
+        )
+    else:
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(name, text, ingredients, '
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        names = INGREDIENT_NAMES.format(agg="group_concat(i.name, ' ')")
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+            f'SELECT r.id, r.name, r.text, {names} FROM foods_recipe r'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS foods_recipe_search_vector_gin'
+        )
+    else:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0007_feed_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    # SQL заморожен в миграции и не зависит от foods.shopping_list
+    schema_editor.execute(
+        'INSERT INTO foods_shoppinglistitem (user_id, ingredient_id, amount) '
+        'SELECT p.user_id, a.ingredients_id, SUM(a.amount) '
+        'FROM foods_purchaselist p '
+        'JOIN foods_ingredientsamount a ON a.recipe_id = p.recipe_id '
+        'GROUP BY p.user_id, a.ingredients_id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0008_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='foods.Ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Покупатель')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Список покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
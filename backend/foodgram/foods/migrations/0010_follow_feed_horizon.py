@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0009_shopping_list'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='feed_horizon',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Горизонт ленты'),
+        ),
+        # Подписка без горизонта целиком читается из Recipe, поэтому
+        # старые записи ленты можно просто удалить. Ленты больших авторов
+        # раскладывает manage.py rebuild_feed после миграции
+        migrations.RunSQL(
+            'DELETE FROM foods_feeditem', migrations.RunSQL.noop,
+        ),
+    ]
@@ -2,8 +2,13 @@ import re
 
 from colorfield.fields import ColorField
 from django.contrib.auth.models import AbstractUser
-from django.core.exceptions import ValidationError
+from django.contrib.auth.models import UserManager as BaseUserManager
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import EmptyResultSet, ValidationError
 from django.db import models
+from django.db.models.functions import Lower, RowNumber
+
+from .images import store_image
 
 USERNAME_ME_ERROR = 'Username указан неверно! Нельзя указать username "me"'
 INVALID_CHARACTER_ERR = ('Username указан неверно!'
@@ -24,6 +29,22 @@ def username_validator(value):
     return value
 
 
+class UserManager(BaseUserManager):
+
+    def filter_by_login(self, login):
+        """Пользователи с email или username, совпадающим с login без учета
+        регистра. Условия совпадают с функциональными индексами
+        lower(email) и lower(username)."""
+        login = models.Value(login, output_field=models.CharField())
+        return self.annotate(
+            email_lower=Lower('email'),
+            username_lower=Lower('username'),
+        ).filter(
+            models.Q(email_lower=Lower(login))
+            | models.Q(username_lower=Lower(login))
+        )
+
+
 class User(AbstractUser):
     email = models.EmailField(
         unique=True,
@@ -51,6 +72,18 @@ class User(AbstractUser):
         verbose_name='Пароль',
         blank=False
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
+
+    objects = UserManager()
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -88,11 +121,56 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = (
+            models.Index(
+                fields=('name', 'measurement_unit'),
+                name='ingredient_name_unit_idx'
+            ),
+        )
 
     def __str__(self):
         return str(self.id)
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Подтягивает автора, тэги и ингредиенты фиксированным числом
+        запросов, независимо от количества рецептов."""
+        return self.select_related('author').prefetch_related(
+            models.Prefetch('tags', queryset=Tag.objects.all()),
+            models.Prefetch(
+                'ingredient_amounts',
+                queryset=IngredientsAmount.objects.select_related(
+                    'ingredients'
+                ),
+            ),
+        )
+
+    def latest_per_author(self, limit=None):
+        """Последние limit рецептов каждого автора одним запросом
+        с ROW_NUMBER() OVER (PARTITION BY author)."""
+        if limit is None:
+            return self.order_by('author_id', '-pub_date', '-id')
+        ranked = self.order_by().annotate(
+            row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=(models.F('pub_date').desc(), models.F('id').desc()),
+            )
+        )
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            # Например, author_id__in=[] для страницы без авторов
+            return self.none()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            f'ORDER BY author_id, row_number',
+            (*params, limit),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='recipe',
@@ -116,15 +194,42 @@ class Recipe(models.Model):
         related_name='ingredients',
         verbose_name='Ингредиенты'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах'
+    )
+    # Название, описание и ингредиенты для полнотекстового поиска,
+    # заполняется foods.search.update_search_index
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'), name='recipe_author_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        store_image(self.image)
+        super().save(*args, **kwargs)
+
 
 class IngredientsAmount(models.Model):
     recipe = models.ForeignKey(
@@ -151,6 +256,12 @@ class IngredientsAmount(models.Model):
     class Meta:
         verbose_name = 'Кол-во ингредиентов'
         verbose_name_plural = 'Кол-во ингредиентов'
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredients', 'amount'),
+                name='amount_recipe_ingredient_idx'
+            ),
+        )
 
 
 class Follow(models.Model):
@@ -166,6 +277,12 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор рецепта'
     )
+    # Рецепты автора с этой даты лежат в FeedItem, более старые лента
+    # читает из Recipe. None — лента подписки не разложена и целиком
+    # читается из Recipe
+    feed_horizon = models.DateTimeField(
+        'Горизонт ленты', null=True, blank=True, editable=False
+    )
 
     class Meta:
         verbose_name = 'Подписка'
@@ -176,6 +293,11 @@ class Follow(models.Model):
                 name='unique_follow_user_author'
             )
         ]
+        indexes = (
+            models.Index(
+                fields=('author', 'user'), name='follow_author_user_idx'
+            ),
+        )
 
 
 class Favorite(models.Model):
@@ -221,3 +343,78 @@ class PurchaseList(models.Model):
 
     def __str__(self):
         return f'{self.user} - {self.recipe}'
+
+
+class FeedItem(models.Model):
+    """Рецепт в заранее собранной ленте подписчика.
+
+    Заполняется при публикации только для авторов с большим числом
+    подписчиков, рецепты остальных авторов лента собирает при чтении.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_feed_item'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_date_recipe_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам корзины пользователя.
+
+    Поддерживается foods.shopping_list при изменении корзины и
+    ингредиентов рецептов, пересобирается командой
+    rebuild_shopping_lists.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Покупатель',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    # Без CHECK >= 0: при вычитании значение может на время стать
+    # отрицательным, такие строки сразу удаляются
+    amount = models.IntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} - {self.amount}'
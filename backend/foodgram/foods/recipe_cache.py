@@ -0,0 +1,50 @@
+from django.db import transaction
+
+from . import reference_cache
+
+
+def recipe_namespace(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def author_namespace(author_id):
+    return f'author:{author_id}'
+
+
+def fragment_versions(recipes):
+    """Версия общей для всех пользователей части каждого рецепта.
+
+    Складывается из версий самого рецепта (поля, тэги, ингредиенты),
+    профиля автора и справочников тэгов и ингредиентов: изменение
+    любой из них делает старые фрагменты недоступными.
+    """
+    namespaces = {reference_cache.TAGS, reference_cache.INGREDIENTS}
+    for recipe in recipes:
+        namespaces.add(recipe_namespace(recipe.pk))
+        namespaces.add(author_namespace(recipe.author_id))
+    versions = reference_cache.get_versions(namespaces)
+    common = (
+        f'{versions[reference_cache.TAGS]}.'
+        f'{versions[reference_cache.INGREDIENTS]}'
+    )
+    return {
+        recipe.pk: (
+            f'{versions[recipe_namespace(recipe.pk)]}.'
+            f'{versions[author_namespace(recipe.author_id)]}.{common}'
+        )
+        for recipe in recipes
+    }
+
+
+def bump_on_commit(namespace):
+    # До коммита параллельный запрос мог бы закэшировать старые данные
+    # уже под новой версией
+    transaction.on_commit(lambda: reference_cache.bump_version(namespace))
+
+
+def recipe_changed(recipe_id):
+    bump_on_commit(recipe_namespace(recipe_id))
+
+
+def author_changed(author_id):
+    bump_on_commit(author_namespace(author_id))
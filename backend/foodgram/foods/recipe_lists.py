@@ -0,0 +1,80 @@
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from . import membership_cache, shopping_list
+from .models import Favorite, PurchaseList, Recipe, User
+
+# Список: (модель строк, счетчик рецепта)
+LISTS = {
+    membership_cache.FAVORITES: (Favorite, 'favorites_count'),
+    membership_cache.CART: (PurchaseList, 'in_carts_count'),
+}
+
+
+def lock_user(user_id):
+    # Изменения списков одного пользователя выполняются по очереди,
+    # поэтому разница с текущим составом списка точна и счетчики
+    # не расходятся при параллельных запросах
+    list(User.objects.select_for_update().filter(pk=user_id).values('pk'))
+
+
+def change_counters(field, recipe_ids, delta):
+    """Меняет счетчик сразу у всех рецептов одним UPDATE."""
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            **{field: Greatest(F(field) + delta, Value(0))}
+        )
+
+
+def add(user_id, kind, recipe_ids):
+    """Добавляет рецепты в избранное или корзину. Уже добавленные
+    пропускаются; возвращает id добавленных рецептов."""
+    model, field = LISTS[kind]
+    with transaction.atomic():
+        lock_user(user_id)
+        present = set(model.objects.filter(
+            user_id=user_id, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+        added = [pk for pk in dict.fromkeys(recipe_ids) if pk not in present]
+        # bulk_create не отправляет сигналы: счетчики и список покупок
+        # обновляются здесь же, пакетно
+        model.objects.bulk_create(
+            [model(user_id=user_id, recipe_id=pk) for pk in added],
+            ignore_conflicts=True,
+        )
+        change_counters(field, added, 1)
+        if kind == membership_cache.CART:
+            shopping_list.add(user_id, added)
+        if added:
+            membership_cache.invalidate(user_id)
+    return added
+
+
+def remove(user_id, kind, recipe_ids):
+    """Убирает рецепты из избранного или корзины одним DELETE.
+    Отсутствующие пропускаются; возвращает id убранных рецептов."""
+    model, field = LISTS[kind]
+    with transaction.atomic():
+        lock_user(user_id)
+        removed = list(model.objects.filter(
+            user_id=user_id, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+        if removed:
+            if kind == membership_cache.CART:
+                shopping_list.remove(user_id, removed)
+            placeholders = ', '.join(['%s'] * len(removed))
+            # Сырой DELETE не отправляет сигналы: счетчики меняются ниже
+            # через change_counters, список покупок — выше
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'DELETE FROM {} WHERE user_id = %s '
+                    'AND recipe_id IN ({})'.format(
+                        connection.ops.quote_name(model._meta.db_table),
+                        placeholders,
+                    ),
+                    [user_id, *removed],
+                )
+            change_counters(field, removed, -1)
+            membership_cache.invalidate(user_id)
+    return removed
@@ -0,0 +1,59 @@
+import time
+
+from django.core.cache import cache
+
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+
+
+def version_key(namespace):
+    return f'reference:{namespace}:version'
+
+
+def get_version(namespace):
+    """Версия справочника — время последнего изменения в миллисекундах.
+
+    Хранится в общем кэше, поэтому ее же можно отдавать клиенту
+    как Last-Modified. Если ключ вытеснен, версия начинается заново.
+    """
+    key = version_key(namespace)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    now = int(time.time() * 1000)
+    cache.add(key, now, timeout=None)
+    # Если кэш недоступен, версия живет до следующего запроса
+    return cache.get(key) or now
+
+
+def get_versions(namespaces):
+    """Версии нескольких пространств имен одним обращением к кэшу."""
+    keys = {namespace: version_key(namespace) for namespace in namespaces}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for namespace, key in keys.items():
+        version = found.get(key)
+        versions[namespace] = (
+            version if version is not None else get_version(namespace)
+        )
+    return versions
+
+
+def bump_version(namespace):
+    """Новая версия не меньше текущего времени в миллисекундах.
+
+    incr атомарен, поэтому два изменения подряд, даже в одну
+    миллисекунду, получают разные версии.
+    """
+    key = version_key(namespace)
+    now = int(time.time() * 1000)
+    cache.add(key, now - 1, timeout=None)
+    try:
+        version = cache.incr(key)
+        if version < now:
+            version = cache.incr(key, now - version)
+    except ValueError:
+        # Ключ вытеснен между add и incr
+        cache.set(key, now, timeout=None)
+        version = now
+    return version
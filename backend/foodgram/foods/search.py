@@ -0,0 +1,150 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import (Case, CharField, F, FloatField, Func,
+                              IntegerField, Q, Value, When)
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+
+from .ingredient_index import normalize
+
+FTS_TABLE = 'foods_recipe_fts'
+SEARCH_CONFIG = 'russian'
+# Веса колонок name, text, ingredients для bm25 — как веса A, B, C
+# у ts_rank по умолчанию
+FTS_WEIGHTS = (1.0, 0.4, 0.2)
+SQLITE_BATCH_SIZE = 500
+
+INGREDIENT_NAMES = (
+    "(SELECT {agg} FROM foods_ingredientsamount a "
+    "JOIN foods_ingredient i ON i.id = a.ingredients_id "
+    "WHERE a.recipe_id = r.id)"
+)
+
+
+class Casefold(Func):
+    """Строка, приведенная к виду ingredient_index.normalize (sqlite)."""
+    function = 'FOODGRAM_CASEFOLD'
+    output_field = CharField()
+
+
+def casefold(value):
+    return None if value is None else normalize(value)
+
+
+@receiver(connection_created)
+def register_casefold(connection, **kwargs):
+    # LIKE и lower() в sqlite не меняют регистр кириллицы
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            Casefold.function, 1, casefold, deterministic=True
+        )
+
+
+def trigram_search_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def search_by_name(queryset, query, field='name'):
+    """Поиск по имени с ранжированием.
+
+    На PostgreSQL используются GIN-индексы pg_trgm: подстрока ищется через
+    icontains, опечатки — оператором %, порядок — совпадения по началу
+    имени, затем по убыванию похожести. В sqlite — LIKE по строкам,
+    приведенным к одному регистру так же, как в ingredient_index.
+    """
+    if not trigram_search_enabled():
+        return queryset.annotate(
+            **{f'{field}_casefold': Casefold(field)}
+        ).filter(**{f'{field}_casefold__contains': normalize(query)})
+    return queryset.filter(
+        Q(**{f'{field}__icontains': query})
+        | Q(**{f'{field}__trigram_similar': query})
+    ).annotate(
+        prefix_rank=Case(
+            When(**{f'{field}__istartswith': query}, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+        similarity=TrigramSimilarity(field, query),
+    ).order_by('prefix_rank', '-similarity', field)
+
+
+def full_text_search(queryset, query):
+    """Полнотекстовый поиск по названию, описанию и ингредиентам.
+
+    В PostgreSQL — хранимый tsvector с GIN-индексом и ранжированием
+    ts_rank, в sqlite — теневая таблица FTS5 с bm25.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    terms = ' '.join(
+        '"{}"*'.format(term.replace('"', '""')) for term in query.split()
+    )
+    if not terms:
+        return queryset.none()
+    # id__in=RawSQL(...) в sqlite превращается в IN ((SELECT ...)) и
+    # сравнивается только с первой строкой, поэтому условие — через extra
+    return queryset.extra(where=[
+        f'foods_recipe.id IN (SELECT rowid FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s)'
+    ], params=[terms]).annotate(search_rank=RawSQL(
+        f'SELECT -bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))}) '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+        f'AND rowid = foods_recipe.id', [terms], output_field=FloatField()
+    )).order_by('-search_rank', '-pub_date', '-id')
+
+
+def update_search_index(recipe_ids=None, using=connection):
+    """Пересобирает поисковые данные рецептов (всех, если ids не заданы):
+    tsvector с весами A/B/C в PostgreSQL или строки FTS5 в sqlite."""
+    if recipe_ids is not None and not recipe_ids:
+        return
+    with using.cursor() as cursor:
+        if using.vendor == 'postgresql':
+            where, params = '', []
+            if recipe_ids is not None:
+                where, params = 'WHERE r.id = ANY(%s)', [list(recipe_ids)]
+            names = INGREDIENT_NAMES.format(agg="string_agg(i.name, ' ')")
+            cursor.execute(
+                'UPDATE foods_recipe r SET search_vector = '
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+                "coalesce(r.name, '')), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+                "coalesce(r.text, '')), 'B') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+                f"coalesce({names}, '')), 'C') {where}",
+                params,
+            )
+            return
+        names = INGREDIENT_NAMES.format(agg="group_concat(i.name, ' ')")
+        insert = (
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+            f'SELECT r.id, r.name, r.text, {names} FROM foods_recipe r'
+        )
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(insert)
+            return
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), SQLITE_BATCH_SIZE):
+            batch = recipe_ids[start:start + SQLITE_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                batch,
+            )
+            cursor.execute(f'{insert} WHERE r.id IN ({placeholders})', batch)
+
+
+def remove_from_search_index(recipe_id):
+    # tsvector удаляется вместе со строкой рецепта, FTS5 — отдельно
+    if connection.vendor != 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
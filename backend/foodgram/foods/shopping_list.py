@@ -0,0 +1,126 @@
+from django.db import connection
+
+from .models import IngredientsAmount, PurchaseList, ShoppingListItem
+
+
+def tables():
+    return {
+        model.__name__.lower(): connection.ops.quote_name(
+            model._meta.db_table
+        )
+        for model in (IngredientsAmount, PurchaseList, ShoppingListItem)
+    }
+
+
+def upsert(select, params):
+    """Прибавляет строки (user_id, ingredient_id, amount) из SELECT
+    к списку покупок одним INSERT ... ON CONFLICT DO UPDATE."""
+    # В sqlite у SELECT перед ON CONFLICT обязательно должен быть WHERE
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {shoppinglistitem} (user_id, ingredient_id, amount) '
+            f'{select} '
+            'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET amount = '
+            '{shoppinglistitem}.amount + EXCLUDED.amount'
+            .format(**tables()),
+            params,
+        )
+
+
+def drop_empty(where, params):
+    """Удаляет исчерпанные строки у пользователей из выборки корзин."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM {shoppinglistitem} WHERE amount <= 0 '
+            'AND user_id IN (SELECT p.user_id FROM {purchaselist} p '
+            f'WHERE {where})'.format(**tables()),
+            params,
+        )
+
+
+def apply_carts(where, params, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+    из строк корзины, подходящих под where."""
+    upsert(
+        'SELECT p.user_id, a.ingredients_id, SUM(a.amount) * %s '
+        'FROM {purchaselist} p '
+        'JOIN {ingredientsamount} a ON a.recipe_id = p.recipe_id '
+        f'WHERE {where} GROUP BY p.user_id, a.ingredients_id'
+        .format(**tables()),
+        [sign, *params],
+    )
+    if sign < 0:
+        drop_empty(where, params)
+
+
+def user_recipes(user_id, recipe_ids):
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    return (
+        f'p.user_id = %s AND p.recipe_id IN ({placeholders})',
+        [user_id, *recipe_ids],
+    )
+
+
+def add(user_id, recipe_ids):
+    """Вызывается после того, как рецепты попали в корзину."""
+    if recipe_ids:
+        apply_carts(*user_recipes(user_id, recipe_ids), 1)
+
+
+def remove(user_id, recipe_ids):
+    """Вызывается до удаления рецептов из корзины."""
+    if recipe_ids:
+        apply_carts(*user_recipes(user_id, recipe_ids), -1)
+
+
+def cart_removed(user_id, recipe_id):
+    """Вычитает рецепт из списка пользователя после удаления строки
+    корзины через ORM."""
+    upsert(
+        'SELECT CAST(%s AS integer), a.ingredients_id, -SUM(a.amount) '
+        'FROM {ingredientsamount} a WHERE a.recipe_id = %s '
+        'GROUP BY a.ingredients_id'.format(**tables()),
+        [user_id, recipe_id],
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM {shoppinglistitem} WHERE amount <= 0 '
+            'AND user_id = %s'.format(**tables()),
+            [user_id],
+        )
+
+
+def recipe_changed(recipe_id, deltas):
+    """Переносит в списки покупок изменения ингредиентов рецепта.
+
+    deltas — {ingredient_id: новое количество минус старое}.
+    """
+    deltas = [(pk, delta) for pk, delta in deltas.items() if delta]
+    if not deltas:
+        return
+    values = ' UNION ALL '.join(
+        ['SELECT CAST(%s AS integer) AS ingredient_id, '
+         'CAST(%s AS integer) AS amount'] * len(deltas)
+    )
+    upsert(
+        'SELECT p.user_id, d.ingredient_id, d.amount '
+        f'FROM {{purchaselist}} p, ({values}) d '
+        'WHERE p.recipe_id = %s'.format(**tables()),
+        [*(value for delta in deltas for value in delta), recipe_id],
+    )
+    drop_empty('p.recipe_id = %s', [recipe_id])
+
+
+def rebuild(user_ids=None):
+    """Собирает списки покупок заново по корзинам (всем или заданных
+    пользователей). Возвращает число строк."""
+    items = ShoppingListItem.objects.all()
+    where, params = '1 = 1', []
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        where, params = f'p.user_id IN ({placeholders})', list(user_ids)
+    items.delete()
+    if user_ids is None or user_ids:
+        apply_carts(where, params, 1)
+    return items.count()
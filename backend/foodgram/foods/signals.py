@@ -0,0 +1,186 @@
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed, recipe_cache, reference_cache, shopping_list
+from .models import (Follow, Ingredient, IngredientsAmount, PurchaseList,
+                     Recipe, Tag, User)
+from .search import remove_from_search_index, update_search_index
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    reference_cache.bump_version(reference_cache.INGREDIENTS)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    reference_cache.bump_version(reference_cache.TAGS)
+
+
+def connect_counters():
+    """Счетчики меняются тем же соединением сразу после записи строки,
+    поэтому попадают в ту же транзакцию, что и сама запись."""
+    for source_name, link, target_name, field in counters.COUNTERS:
+        source = apps.get_model('foods', source_name)
+        target = apps.get_model('foods', target_name)
+
+        def added(instance, created, link=link, target=target, field=field,
+                  **kwargs):
+            if created and not kwargs.get('raw'):
+                counters.change(target, getattr(instance, link), field, 1)
+
+        def removed(instance, link=link, target=target, field=field,
+                    **kwargs):
+            counters.change(target, getattr(instance, link), field, -1)
+
+        post_save.connect(added, sender=source, weak=False,
+                          dispatch_uid=f'{field}_added')
+        post_delete.connect(removed, sender=source, weak=False,
+                            dispatch_uid=f'{field}_removed')
+
+
+connect_counters()
+
+
+# Ленты подписчиков больших авторов. Обработчики подключены после
+# счетчиков, поэтому видят уже обновленный followers_count
+@receiver(post_save, sender=Recipe)
+def publish_to_feeds(instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        transaction.on_commit(lambda: feed.publish([instance.pk]))
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed(instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        feed.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(instance, **kwargs):
+    feed.unfollow(instance.user_id, instance.author_id)
+
+
+# Поисковый индекс пересобирается после коммита: к этому моменту
+# сериализатор уже записал ингредиенты рецепта
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, **kwargs):
+    transaction.on_commit(lambda: update_search_index([instance.pk]))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(instance, **kwargs):
+    remove_from_search_index(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: update_search_index(
+        IngredientsAmount.objects.filter(ingredients=instance)
+        .values_list('recipe_id', flat=True)
+    ))
+
+
+# Ингредиенты, измененные через админку или ORM без сохранения рецепта.
+# Сериализатор пишет их пакетно без сигналов, индекс там обновляется
+# по post_save рецепта
+@receiver(post_save, sender=IngredientsAmount)
+def reindex_amount_recipe(instance, **kwargs):
+    recipe_ids = {instance.recipe_id}
+    previous = getattr(instance, '_saved_amount', None)
+    if previous is not None:
+        recipe_ids.add(previous[0])
+    transaction.on_commit(lambda: update_search_index(recipe_ids))
+
+
+@receiver(post_delete, sender=IngredientsAmount)
+def unindex_amount(instance, **kwargs):
+    transaction.on_commit(
+        lambda: update_search_index([instance.recipe_id])
+    )
+
+
+# Список покупок — сумма по парам (строка корзины, строка ингредиента).
+# Удаленная строка вычитает только пары, которые еще есть в БД, поэтому
+# при каскадном удалении рецепта, пользователя или ингредиента итог
+# не зависит от порядка. Обработчики покрывают админку и ORM: bulk_create,
+# bulk_update и сырой DELETE сигналов не отправляют, recipe_lists
+# и сериализатор рецепта меняют списки сами одним запросом
+@receiver(post_save, sender=PurchaseList)
+def cart_added(instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        shopping_list.add(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=PurchaseList)
+def cart_removed(instance, **kwargs):
+    shopping_list.cart_removed(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_save, sender=IngredientsAmount)
+def remember_amount(instance, **kwargs):
+    instance._saved_amount = None
+    if instance.pk is not None and not kwargs.get('raw'):
+        instance._saved_amount = IngredientsAmount.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredients_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientsAmount)
+def amount_saved(instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    deltas = defaultdict(Counter)
+    deltas[instance.recipe_id][instance.ingredients_id] += instance.amount
+    if instance._saved_amount is not None:
+        recipe_id, ingredient_id, amount = instance._saved_amount
+        deltas[recipe_id][ingredient_id] -= amount
+    for recipe_id, recipe_deltas in deltas.items():
+        shopping_list.recipe_changed(recipe_id, recipe_deltas)
+
+
+@receiver(post_delete, sender=IngredientsAmount)
+def amount_deleted(instance, **kwargs):
+    shopping_list.recipe_changed(
+        instance.recipe_id, {instance.ingredients_id: -instance.amount}
+    )
+
+
+# Версии кэша фрагментов рецептов. Счетчики меняются через update()
+# без сигналов и версию не трогают: favorites_count подставляется
+# в ответ отдельно
+@receiver(post_save, sender=Recipe)
+def recipe_fragment_changed(instance, **kwargs):
+    recipe_cache.recipe_changed(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=IngredientsAmount)
+def recipe_ingredients_changed(instance, **kwargs):
+    recipe_cache.recipe_changed(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_cache.recipe_changed(instance.pk)
+        return
+    if action == 'post_clear':
+        # pk_set в post_clear пуст: рецепты тэга меняются разом
+        recipe_cache.bump_on_commit(reference_cache.TAGS)
+        return
+    for recipe_id in pk_set:
+        recipe_cache.recipe_changed(recipe_id)
+
+
+@receiver(post_save, sender=User)
+def author_fragment_changed(instance, **kwargs):
+    recipe_cache.author_changed(instance.pk)
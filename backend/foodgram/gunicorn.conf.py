@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+
+# Django с psycopg2 упирается в CPU и GIL, поэтому по умолчанию —
+# синхронные воркеры по формуле 2 * CPU + 1. При threads > 1 gunicorn
+# переключается на gthread
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.getenv('GUNICORN_THREADS', default=1))
+
+# Приложение и индекс ингредиентов загружаются один раз в мастере
+# и достаются воркерам через fork
+preload_app = True
+
+# Перезапуск воркеров против утечек памяти, со сдвигом, чтобы они
+# не перезапускались одновременно
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = int(
+    os.getenv('GUNICORN_MAX_REQUESTS_JITTER', default=100)
+)
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def when_ready(server):
+    # Индекс ингредиентов строится в мастере один раз и достается
+    # воркерам через fork. Открытые при этом соединения нельзя делить
+    # между воркерами
+    from django.core.cache import caches
+    from django.db import connections
+    from foodgram.warmup import warm_up
+
+    if server.cfg.preload_app:
+        warm_up()
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+
+
+def post_worker_init(worker):
+    # Каждый воркер открывает свое соединение с БД и проверяет кэши
+    # до того, как начнет принимать запросы
+    from foodgram.warmup import warm_up
+
+    warm_up()
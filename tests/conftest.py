@@ -0,0 +1,98 @@
+import base64
+
+import pytest
+from django.core.cache import caches
+from foods.models import Ingredient, Recipe, Tag, User
+from rest_framework.test import APIClient
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAC'
+    'hwGA60e6kgAAAABJRU5ErkJggg=='
+)
+IMAGE = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture
+def clear_caches():
+    def clear():
+        for cache in caches.all():
+            cache.clear()
+    return clear
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username='user', email='user@example.com', password='password123'
+    )
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(
+        username='author', email='author@example.com', password='password123'
+    )
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=name, slug=slug, color=color)
+        for name, slug, color in (
+            ('Завтрак', 'breakfast', '#49B64E'),
+            ('Обед', 'lunch', '#02B6B6'),
+        )
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name=f'ингредиент {i}', measurement_unit='г')
+        for i in range(5)
+    ]
+
+
+@pytest.fixture
+def create_recipe(author_client, tags, ingredients):
+    def create(name='Рецепт', amounts=(1, 2, 3)):
+        response = author_client.post('/api/recipes/', {
+            'tags': [tag.id for tag in tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in zip(ingredients, amounts)
+            ],
+            'image': IMAGE,
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 10,
+        }, format='json')
+        assert response.status_code == 201, response.content
+        return Recipe.objects.get(pk=response.data['id'])
+    return create
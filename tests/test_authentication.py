@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from knox.models import AuthToken
+from knox.settings import knox_settings
+from rest_framework.test import APIClient
+
+
+def token_client(user):
+    _, token = AuthToken.objects.create(user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+    return client
+
+
+@pytest.mark.django_db
+def test_password_change_revokes_tokens(user):
+    client = token_client(user)
+    assert client.get('/api/users/me/').status_code == 200
+
+    response = client.post('/api/users/set_password/', {
+        'current_password': 'password123', 'new_password': 'NewPass!2345',
+    })
+
+    assert response.status_code == 204
+    assert not AuthToken.objects.filter(user=user).exists()
+    assert client.get('/api/users/me/').status_code == 401
+
+
+@pytest.mark.django_db
+def test_cached_token_is_renewed(user, monkeypatch):
+    monkeypatch.setattr(knox_settings, 'AUTO_REFRESH', True)
+    client = token_client(user)
+    assert client.get('/api/users/me/').status_code == 200
+    expiry = AuthToken.objects.get(user=user).expiry
+
+    later = timezone.now() + timedelta(hours=2)
+    monkeypatch.setattr(timezone, 'now', lambda: later)
+    assert client.get('/api/users/me/').status_code == 200
+
+    assert AuthToken.objects.get(user=user).expiry > expiry
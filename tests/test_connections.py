@@ -0,0 +1,44 @@
+import time
+
+import pytest
+from django.db import connection
+from foodgram.warmup import close_unusable_connections, mark_connections_used
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    calls = []
+
+    def is_usable():
+        calls.append(connection.alias)
+        return False
+
+    monkeypatch.setattr(connection, 'is_usable', is_usable)
+    return calls
+
+
+@pytest.mark.django_db
+def test_busy_connection_is_not_checked(settings, checks):
+    settings.CONN_HEALTH_CHECK_INTERVAL = 30
+    connection.ensure_connection()
+    mark_connections_used()
+
+    close_unusable_connections()
+
+    assert checks == []
+    assert connection.connection is not None
+
+
+@pytest.mark.django_db
+def test_idle_connection_is_checked(settings, checks, monkeypatch):
+    settings.CONN_HEALTH_CHECK_INTERVAL = 30
+    connection.ensure_connection()
+    mark_connections_used()
+    monkeypatch.setattr(
+        connection, 'last_used_at', time.monotonic() - 31
+    )
+    monkeypatch.setattr(connection, 'close', lambda: checks.append('close'))
+
+    close_unusable_connections()
+
+    assert checks == ['default', 'close']
@@ -0,0 +1,101 @@
+import pytest
+from django.core.management import call_command
+from foods.models import FeedItem, User
+from rest_framework.test import APIClient
+
+
+@pytest.fixture
+def big_author(settings):
+    settings.FEED_FANOUT_THRESHOLD = 2
+    settings.FEED_BACKFILL_SIZE = 2
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def read_feed(client):
+    ids = []
+    url = '/api/recipes/feed/?limit=2'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+        ids.extend(recipe['id'] for recipe in response.data['results'])
+        url = response.data['next']
+    return ids
+
+
+def follower(name):
+    return User.objects.create(
+        username=name, email=f'{name}@example.com',
+        first_name=name, last_name=name,
+    )
+
+
+def subscribe(reader, author):
+    response = client_for(reader).post(f'/api/users/{author.id}/subscribe/')
+    assert response.status_code == 200, response.content
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_keeps_history_past_backfill(big_author, user, author,
+                                          create_recipe):
+    recipes = [create_recipe(name=f'Рецепт {i}') for i in range(4)]
+    newest_first = [recipe.id for recipe in reversed(recipes)]
+    subscribe(user, author)
+    other = follower('other')
+    # Второй подписчик делает автора большим: сразу раскладывается только
+    # его лента, ленту первого пока отдает Recipe
+    subscribe(other, author)
+
+    assert FeedItem.objects.filter(user=other).count() == 2
+    assert not FeedItem.objects.filter(user=user).exists()
+    for reader in (user, other):
+        assert read_feed(client_for(reader)) == newest_first
+
+    call_command('rebuild_feed', '--pending')
+
+    assert FeedItem.objects.filter(user=user).count() == 2
+    assert read_feed(client_for(user)) == newest_first
+
+    late = follower('late')
+    subscribe(late, author)
+    newest = create_recipe(name='Новый')
+
+    for reader in (user, other, late):
+        assert read_feed(client_for(reader)) == [newest.id, *newest_first]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_survives_jump_past_threshold(big_author, user, author,
+                                           create_recipe):
+    recipes = [create_recipe(name=f'Рецепт {i}') for i in range(3)]
+    newest_first = [recipe.id for recipe in reversed(recipes)]
+    subscribe(user, author)
+    # Счетчик перешагнул порог, минуя равенство
+    User.objects.filter(pk=author.pk).update(followers_count=5)
+    late = follower('late')
+
+    subscribe(late, author)
+
+    assert FeedItem.objects.filter(user=late).count() == 2
+    for reader in (user, late):
+        assert read_feed(client_for(reader)) == newest_first
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuild_feed_does_not_duplicate(big_author, user, author,
+                                         create_recipe):
+    recipes = [create_recipe(name=f'Рецепт {i}') for i in range(3)]
+    subscribe(user, author)
+    subscribe(follower('other'), author)
+
+    call_command('rebuild_feed')
+    call_command('rebuild_feed', '--pending')
+
+    assert FeedItem.objects.count() == 4
+    assert read_feed(client_for(user)) == [
+        recipe.id for recipe in reversed(recipes)
+    ]
@@ -0,0 +1,48 @@
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from foods.images import store_image
+from foods.models import Recipe
+from PIL import Image
+
+
+def jpeg():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), (200, 100, 50)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@pytest.mark.django_db
+def test_extension_comes_from_image_format():
+    recipe = Recipe(image=ContentFile(jpeg(), name='photo.png'))
+
+    store_image(recipe.image)
+
+    assert recipe.image.name.endswith('.jpg')
+    assert default_storage.exists(recipe.image.name)
+
+
+@pytest.mark.django_db
+def test_concurrent_upload_keeps_hashed_name(monkeypatch):
+    first = Recipe(image=ContentFile(jpeg(), name='a.jpg'))
+    second = Recipe(image=ContentFile(jpeg(), name='b.jpg'))
+    store_image(first.image)
+    # Второй запрос проверил exists() до того, как первый записал файл
+    exists = default_storage.exists
+    checks = []
+
+    def stale_exists(name):
+        if not checks:
+            checks.append(name)
+            return False
+        return exists(name)
+
+    monkeypatch.setattr(default_storage, 'exists', stale_exists)
+
+    store_image(second.image)
+
+    assert second.image.name == first.image.name
+    directory, files = default_storage.listdir('foods/')
+    assert files == [first.image.name.split('/')[-1]]
@@ -0,0 +1,36 @@
+import pytest
+from foods import membership_cache
+from foods.models import Favorite
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stale_membership_is_not_written_back(user, create_recipe):
+    first, second = create_recipe(), create_recipe()
+    stale = membership_cache.get_membership(user)
+
+    # Два параллельных запроса: каждый правит свой рецепт в БД
+    Favorite.objects.create(user=user, recipe=first)
+    membership_cache.invalidate(user.id)
+    Favorite.objects.create(user=user, recipe=second)
+    membership_cache.invalidate(user.id)
+
+    assert stale.favorites == frozenset()
+    assert membership_cache.get_membership(user).favorites == {
+        first.id, second.id
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_flags_follow_writes(user_client, create_recipe):
+    recipe = create_recipe()
+    user_client.get('/api/recipes/')
+
+    user_client.post(f'/api/recipes/{recipe.id}/favorite/')
+    user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    response = user_client.get(f'/api/recipes/{recipe.id}/')
+    assert response.data['is_favorited'] is True
+    assert response.data['is_in_shopping_cart'] is True
+
+    user_client.delete(f'/api/recipes/{recipe.id}/favorite/')
+    response = user_client.get(f'/api/recipes/{recipe.id}/')
+    assert response.data['is_favorited'] is False
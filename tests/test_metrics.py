@@ -0,0 +1,39 @@
+import pytest
+from django.test import Client
+
+
+@pytest.mark.django_db
+def test_metrics_forbidden_for_outside_addresses(settings):
+    settings.METRICS_ALLOWED_IPS = []
+
+    assert Client().get('/metrics').status_code == 403
+
+
+@pytest.mark.django_db
+def test_metrics_for_allowed_address(settings):
+    settings.METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+    response = Client().get('/metrics')
+
+    assert response.status_code == 200
+    assert b'foodgram_requests_total' in response.content
+
+
+@pytest.mark.django_db
+def test_metrics_for_staff(settings, user):
+    settings.METRICS_ALLOWED_IPS = []
+    user.is_staff = True
+    user.save()
+    client = Client()
+    client.force_login(user)
+
+    assert client.get('/metrics').status_code == 200
+
+
+@pytest.mark.django_db
+def test_instrumentation_disabled(settings):
+    settings.REQUEST_INSTRUMENTATION = False
+    client = Client()
+
+    assert 'Server-Timing' not in client.get('/api/tags/')
+    assert client.get('/metrics').status_code == 404
@@ -0,0 +1,59 @@
+import pytest
+
+
+def page(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.content
+    return response.data
+
+
+def ids(data):
+    return [item['id'] for item in data['results']]
+
+
+@pytest.fixture
+def recipes(create_recipe):
+    """Пять рецептов, от новых к старым."""
+    created = [create_recipe(name=f'Рецепт {i}') for i in range(5)]
+    return [recipe.id for recipe in reversed(created)]
+
+
+@pytest.mark.django_db
+def test_cursor_pages_and_links(recipes, user_client):
+    first = page(user_client, '/api/recipes/?pagination=cursor&limit=2')
+    assert first['count'] == 5
+    assert first['previous'] is None
+    assert ids(first) == recipes[:2]
+
+    second = page(user_client, first['next'])
+    assert second['count'] is None
+    assert ids(second) == recipes[2:4]
+
+    last = page(user_client, second['next'])
+    assert ids(last) == recipes[4:]
+    assert last['next'] is None
+
+    assert ids(page(user_client, last['previous'])) == recipes[2:4]
+    back = page(user_client, second['previous'])
+    assert ids(back) == recipes[:2]
+    assert back['previous'] is None
+
+
+@pytest.mark.django_db
+def test_cursor_is_stable_across_inserts(recipes, user_client,
+                                         create_recipe):
+    first = page(user_client, '/api/recipes/?pagination=cursor&limit=2')
+    newest = create_recipe(name='Новый')
+
+    second = page(user_client, first['next'])
+    assert ids(second) == recipes[2:4]
+
+    previous = page(user_client, second['previous'])
+    assert ids(previous) == recipes[:2]
+    assert ids(page(user_client, previous['previous'])) == [newest.id]
+
+
+@pytest.mark.django_db
+def test_invalid_cursor(user_client):
+    response = user_client.get('/api/recipes/?cursor=broken')
+    assert response.status_code == 404
@@ -0,0 +1,34 @@
+import pytest
+
+from .conftest import IMAGE
+
+
+def recipe_data(tags, ingredients, name):
+    return {
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10} for ingredient in ingredients
+        ],
+        'image': IMAGE,
+        'name': name,
+        'text': 'Описание',
+        'cooking_time': 10,
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bulk_create_counts_recipes_once(author, author_client, tags,
+                                         ingredients):
+    response = author_client.post('/api/recipes/bulk/', [
+        recipe_data(tags, ingredients[:2], 'Первый пирог'),
+        recipe_data(tags, ingredients[2:], 'Второй пирог'),
+    ], format='json')
+
+    assert response.status_code == 201, response.content
+    author.refresh_from_db()
+    assert author.recipes_count == 2
+
+    response = author_client.get('/api/recipes/?search=пирог')
+    assert sorted(item['name'] for item in response.data['results']) == [
+        'Второй пирог', 'Первый пирог'
+    ]
@@ -0,0 +1,35 @@
+import pytest
+
+
+def recipe_ids(client, **params):
+    response = client.get('/api/recipes/', params)
+    assert response.status_code == 200, response.content
+    return sorted(item['id'] for item in response.data['results'])
+
+
+@pytest.fixture
+def marked(user_client, create_recipe):
+    """Три рецепта: первый в избранном, второй в корзине."""
+    recipes = [create_recipe(name=f'Рецепт {i}') for i in range(3)]
+    user_client.post(f'/api/recipes/{recipes[0].id}/favorite/')
+    user_client.post(f'/api/recipes/{recipes[1].id}/shopping_cart/')
+    return recipes
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('param, index', (
+    ('is_favorited', 0),
+    ('is_in_shopping_cart', 1),
+))
+def test_user_list_filters(param, index, marked, user_client,
+                           anonymous_client):
+    everything = sorted(recipe.id for recipe in marked)
+
+    for value in ('1', 'true'):
+        assert recipe_ids(user_client, **{param: value}) == [
+            marked[index].id
+        ]
+    for value in ('0', 'false'):
+        assert recipe_ids(user_client, **{param: value}) == []
+    assert recipe_ids(user_client) == everything
+    assert recipe_ids(anonymous_client, **{param: '1'}) == everything
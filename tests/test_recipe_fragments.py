@@ -0,0 +1,93 @@
+import pytest
+from foods import reference_cache
+
+
+def first_recipe(client):
+    response = client.get('/api/recipes/')
+    assert response.status_code == 200
+    return response.data['results'][0]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fragment_follows_author_change(create_recipe, user_client, author):
+    create_recipe()
+    assert first_recipe(user_client)['author']['first_name'] == ''
+
+    author.first_name = 'Другое имя'
+    author.save()
+
+    assert first_recipe(user_client)['author']['first_name'] == 'Другое имя'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fragment_follows_tag_and_ingredient_renames(
+    create_recipe, user_client, tags, ingredients
+):
+    create_recipe()
+    first_recipe(user_client)
+
+    tags[0].name = 'Ужин'
+    tags[0].save()
+    ingredients[0].name = 'Мука'
+    ingredients[0].save()
+
+    recipe = first_recipe(user_client)
+    assert 'Ужин' in [tag['name'] for tag in recipe['tags']]
+    assert 'Мука' in [item['name'] for item in recipe['ingredients']]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fragment_follows_recipe_tags_and_ingredients(
+    create_recipe, user_client, tags, ingredients
+):
+    recipe = create_recipe()
+    first_recipe(user_client)
+
+    recipe.tags.set([tags[1]])
+    amount = recipe.ingredient_amounts.get(ingredients=ingredients[0])
+    amount.amount = 50
+    amount.save()
+    recipe.ingredient_amounts.get(ingredients=ingredients[1]).delete()
+
+    data = first_recipe(user_client)
+    assert [tag['id'] for tag in data['tags']] == [tags[1].id]
+    assert {
+        item['id']: item['amount'] for item in data['ingredients']
+    } == {ingredients[0].id: 50, ingredients[2].id: 3}
+
+
+def test_bump_version_is_unique_within_a_millisecond(monkeypatch):
+    monkeypatch.setattr(reference_cache.time, 'time', lambda: 1000.0)
+    namespace = 'recipe:test'
+
+    versions = [reference_cache.bump_version(namespace) for _ in range(3)]
+
+    assert versions == sorted(set(versions))
+    assert versions[0] >= 1000 * 1000
+    assert reference_cache.get_version(namespace) == versions[-1]
+
+
+def test_concurrent_bumps_get_different_versions(monkeypatch):
+    namespace = 'recipe:concurrent'
+    stale = reference_cache.get_version(namespace)
+    # Оба изменения прочитали версию до того, как другое ее записало
+    monkeypatch.setattr(
+        reference_cache.cache, 'get', lambda key, default=None: stale
+    )
+
+    first = reference_cache.bump_version(namespace)
+    second = reference_cache.bump_version(namespace)
+
+    assert first != second
+
+
+def test_versions_are_not_culled(monkeypatch):
+    clock = iter(range(10 ** 6, 10 ** 7))
+    monkeypatch.setattr(reference_cache.time, 'time', lambda: next(clock))
+    namespaces = [f'recipe:{i}' for i in range(2000)]
+    versions = {
+        namespace: reference_cache.get_version(namespace)
+        for namespace in namespaces
+    }
+
+    assert reference_cache.get_versions(namespaces) == versions
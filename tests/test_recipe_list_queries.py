@@ -0,0 +1,56 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from foods.models import Favorite, Follow, PurchaseList
+
+LIMITS = (1, 3, 6)
+
+
+def count_queries(client, path):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(path)
+    assert response.status_code == 200
+    return len(context.captured_queries)
+
+
+@pytest.fixture
+def recipes(create_recipe, user, author):
+    recipes = [create_recipe(name=f'Рецепт {i}') for i in range(6)]
+    Follow.objects.create(user=user, author=author)
+    Favorite.objects.create(user=user, recipe=recipes[0])
+    PurchaseList.objects.create(user=user, recipe=recipes[1])
+    return recipes
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('client_name', ('anonymous_client', 'user_client'))
+@pytest.mark.parametrize('warm', (False, True), ids=('cold', 'warm'))
+def test_recipe_list_query_count_does_not_depend_on_limit(
+    request, recipes, clear_caches, django_assert_num_queries,
+    client_name, warm
+):
+    client = request.getfixturevalue(client_name)
+
+    def measure(limit):
+        clear_caches()
+        path = f'/api/recipes/?limit={limit}'
+        if warm:
+            client.get(path)
+        return path
+
+    expected = count_queries(client, measure(LIMITS[0]))
+    for limit in LIMITS[1:]:
+        path = measure(limit)
+        with django_assert_num_queries(expected):
+            response = client.get(path)
+        assert len(response.data['results']) == limit
+
+
+@pytest.mark.django_db
+def test_recipe_list_flags(recipes, user_client):
+    response = user_client.get('/api/recipes/?limit=6')
+    results = {item['id']: item for item in response.data['results']}
+    assert results[recipes[0].id]['is_favorited'] is True
+    assert results[recipes[1].id]['is_in_shopping_cart'] is True
+    assert results[recipes[2].id]['is_favorited'] is False
+    assert all(item['author']['is_subscribed'] for item in results.values())
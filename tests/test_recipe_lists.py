@@ -0,0 +1,109 @@
+import pytest
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from foods.models import IngredientsAmount, Recipe, ShoppingListItem
+
+LISTS = (
+    ('/api/recipes/favorite/', 'favorites_count'),
+    ('/api/recipes/shopping_cart/', 'in_carts_count'),
+)
+
+
+def counters(recipes, field):
+    return list(
+        Recipe.objects.filter(pk__in=[recipe.id for recipe in recipes])
+        .order_by('id').values_list(field, flat=True)
+    )
+
+
+def change(client, method, url, recipes):
+    response = getattr(client, method)(
+        url, {'recipes': [recipe.id for recipe in recipes]}, format='json'
+    )
+    assert response.status_code == 200, response.content
+    return response.data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, field', LISTS)
+def test_bulk_add_is_idempotent(url, field, user_client, create_recipe):
+    recipes = [create_recipe(name=f'Рецепт {i}') for i in range(3)]
+
+    assert change(user_client, 'put', url, recipes[:2])['added'] == [
+        recipe.id for recipe in recipes[:2]
+    ]
+    assert change(user_client, 'put', url, recipes)['added'] == [
+        recipes[2].id
+    ]
+    assert change(user_client, 'put', url, recipes)['added'] == []
+    assert counters(recipes, field) == [1, 1, 1]
+
+    assert change(user_client, 'delete', url, recipes[:2])['removed'] == [
+        recipe.id for recipe in recipes[:2]
+    ]
+    assert change(user_client, 'delete', url, recipes[:2])['removed'] == []
+    assert counters(recipes, field) == [0, 0, 1]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, field', LISTS)
+def test_bulk_ids_limit(url, field, user_client):
+    response = user_client.delete(
+        url, {'recipes': list(range(1, 1001))}, format='json'
+    )
+    assert response.status_code == 200
+
+    response = user_client.delete(
+        url, {'recipes': list(range(1, 1002))}, format='json'
+    )
+    assert response.status_code == 400
+    assert 'recipes' in response.data
+
+
+@pytest.mark.django_db
+def test_bulk_cart_delete_keeps_shopping_list(user, user_client,
+                                             create_recipe):
+    recipes = [
+        create_recipe(name='Первый', amounts=(1, 2, 3)),
+        create_recipe(name='Второй', amounts=(10, 20)),
+        create_recipe(name='Третий', amounts=(100,)),
+    ]
+    url = '/api/recipes/shopping_cart/'
+    change(user_client, 'put', url, recipes)
+
+    change(user_client, 'delete', url, recipes[:2])
+
+    shopping_list = dict(
+        ShoppingListItem.objects.filter(user=user)
+        .values_list('ingredient_id', 'amount')
+    )
+    from_carts = dict(
+        IngredientsAmount.objects.filter(recipe__recipe_cart__user=user)
+        .values('ingredients_id').annotate(total=Sum('amount'))
+        .values_list('ingredients_id', 'total')
+    )
+    assert shopping_list == from_carts
+    assert list(shopping_list.values()) == [100]
+    assert counters(recipes, 'in_carts_count') == [0, 0, 1]
+
+
+def queries(client, method, url, recipes):
+    with CaptureQueriesContext(connection) as context:
+        change(client, method, url, recipes)
+    return len(context)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, field', LISTS)
+def test_bulk_queries_do_not_grow_with_recipes(url, field, user_client,
+                                               create_recipe):
+    recipes = [create_recipe(name=f'Рецепт {i}') for i in range(12)]
+    few, many = recipes[:2], recipes[2:]
+
+    assert queries(user_client, 'put', url, few) == queries(
+        user_client, 'put', url, many
+    )
+    assert queries(user_client, 'delete', url, few) == queries(
+        user_client, 'delete', url, many
+    )
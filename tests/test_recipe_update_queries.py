@@ -0,0 +1,80 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from foods.models import Ingredient, ShoppingListItem
+
+from .conftest import IMAGE
+
+
+@pytest.fixture
+def many_ingredients(db):
+    Ingredient.objects.bulk_create([
+        Ingredient(name=f'продукт {i}', measurement_unit='г')
+        for i in range(40)
+    ])
+    return list(
+        Ingredient.objects.filter(name__startswith='продукт').order_by('id')
+    )
+
+
+def recipe_data(tags, amounts):
+    return {
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': amount}
+            for ingredient, amount in amounts
+        ],
+        'image': IMAGE,
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+    }
+
+
+def patch_queries(author_client, user_client, tags, ingredients, kept,
+                  removed):
+    """Создает рецепт из kept + removed ингредиентов, кладет его в корзину
+    и меняет: removed удаляются, одно количество меняется, два
+    ингредиента добавляются. Возвращает число запросов PATCH."""
+    old = ingredients[:kept + removed]
+    response = author_client.post(
+        '/api/recipes/', recipe_data(tags, [(item, 10) for item in old]),
+        format='json',
+    )
+    assert response.status_code == 201, response.content
+    recipe_id = response.data['id']
+    user_client.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+    new = [(old[0], 15)] + [(item, 10) for item in old[1:kept]] + [
+        (item, 5) for item in ingredients[-2:]
+    ]
+    with CaptureQueriesContext(connection) as context:
+        response = author_client.patch(
+            f'/api/recipes/{recipe_id}/', recipe_data(tags, new),
+            format='json',
+        )
+    assert response.status_code == 200, response.content
+    assert len(response.data['ingredients']) == kept + 2
+    return len(context)
+
+
+@pytest.mark.django_db
+def test_patch_queries_do_not_grow_with_removed_ingredients(
+    user, author_client, user_client, tags, many_ingredients
+):
+    few = patch_queries(
+        author_client, user_client, tags, many_ingredients, 3, 4
+    )
+    many = patch_queries(
+        author_client, user_client, tags, many_ingredients, 3, 29
+    )
+
+    assert few == many
+    amounts = dict(
+        ShoppingListItem.objects.filter(user=user)
+        .values_list('ingredient__name', 'amount')
+    )
+    # Два рецепта в корзине: 15 + 15, 10 + 10 и по 5 + 5 у добавленных
+    assert amounts == {
+        'продукт 0': 30, 'продукт 1': 20, 'продукт 2': 20,
+        'продукт 38': 10, 'продукт 39': 10,
+    }
@@ -0,0 +1,76 @@
+import pytest
+from foods.models import IngredientsAmount
+
+
+@pytest.mark.django_db
+def test_recipe_name_filter_ignores_cyrillic_case(create_recipe, user_client):
+    pancakes = create_recipe(name='Блины со сметаной')
+    create_recipe(name='Омлет')
+
+    response = user_client.get('/api/recipes/?name=блин')
+
+    assert [item['id'] for item in response.data['results']] == [pancakes.id]
+
+
+@pytest.mark.django_db
+def test_ingredient_search_ignores_cyrillic_case(
+    settings, user_client, ingredients
+):
+    settings.INGREDIENT_SEARCH_BACKEND = 'database'
+    ingredients[0].name = 'Ёжевика'
+    ingredients[0].save()
+
+    response = user_client.get('/api/ingredients/?name=ежев')
+
+    assert [item['id'] for item in response.json()] == [ingredients[0].id]
+
+
+def search(client, query):
+    response = client.get('/api/recipes/', {'search': query})
+    assert response.status_code == 200
+    return [item['id'] for item in response.data['results']]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_full_text_search_by_name_text_and_ingredients(
+    create_recipe, user_client, ingredients
+):
+    ingredients[2].name = 'Творог'
+    ingredients[2].save()
+    cheesecake = create_recipe(name='Сырники')
+    soup = create_recipe(name='Суп', amounts=(1, 5))
+
+    assert search(user_client, 'сырники') == [cheesecake.id]
+    assert search(user_client, 'творог') == [cheesecake.id]
+    assert set(search(user_client, 'описание')) == {cheesecake.id, soup.id}
+    assert search(user_client, 'пельмени') == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_full_text_search_name_ranks_above_ingredients(
+    create_recipe, user_client, ingredients
+):
+    ingredients[2].name = 'Морковь'
+    ingredients[2].save()
+    with_carrot = create_recipe(name='Салат')
+    carrot_cake = create_recipe(name='Торт с морковью', amounts=(1, 1))
+
+    assert search(user_client, 'морковь') == [carrot_cake.id, with_carrot.id]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_full_text_search_follows_orm_ingredient_changes(
+    create_recipe, user_client, ingredients
+):
+    recipe = create_recipe(amounts=(1,))
+    ingredients[4].name = 'Кардамон'
+    ingredients[4].save()
+    assert search(user_client, 'кардамон') == []
+
+    amount = IngredientsAmount.objects.create(
+        recipe=recipe, ingredients=ingredients[4], amount=1
+    )
+    assert search(user_client, 'кардамон') == [recipe.id]
+
+    amount.delete()
+    assert search(user_client, 'кардамон') == []
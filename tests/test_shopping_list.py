@@ -0,0 +1,92 @@
+import pytest
+from django.db.models import Sum
+from foods.models import (IngredientsAmount, PurchaseList, Recipe,
+                          ShoppingListItem)
+
+
+def shopping_list(user):
+    return dict(
+        ShoppingListItem.objects.filter(user=user)
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+def from_carts(user):
+    return dict(
+        IngredientsAmount.objects.filter(recipe__recipe_cart__user=user)
+        .values('ingredients_id').annotate(total=Sum('amount'))
+        .values_list('ingredients_id', 'total')
+    )
+
+
+@pytest.fixture
+def recipe_in_cart(user_client, create_recipe):
+    recipe = create_recipe(amounts=(77, 2, 3))
+    response = user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert response.status_code == 200
+    return recipe
+
+
+@pytest.mark.django_db
+def test_orm_amount_change(user, recipe_in_cart, ingredients):
+    amount = recipe_in_cart.ingredient_amounts.get(ingredients=ingredients[0])
+    amount.amount = 100
+    amount.save()
+
+    assert shopping_list(user)[ingredients[0].id] == 100
+    assert shopping_list(user) == from_carts(user)
+
+
+@pytest.mark.django_db
+def test_orm_amount_moved_to_other_ingredient(user, recipe_in_cart,
+                                              ingredients):
+    amount = recipe_in_cart.ingredient_amounts.get(ingredients=ingredients[0])
+    amount.ingredients = ingredients[4]
+    amount.save()
+
+    assert ingredients[0].id not in shopping_list(user)
+    assert shopping_list(user) == from_carts(user)
+
+
+@pytest.mark.django_db
+def test_orm_amount_added_and_deleted(user, recipe_in_cart, ingredients):
+    IngredientsAmount.objects.create(
+        recipe=recipe_in_cart, ingredients=ingredients[3], amount=5
+    )
+    assert shopping_list(user) == from_carts(user)
+
+    recipe_in_cart.ingredient_amounts.get(ingredients=ingredients[1]).delete()
+    assert ingredients[1].id not in shopping_list(user)
+    assert shopping_list(user) == from_carts(user)
+
+
+@pytest.mark.django_db
+def test_api_update_removing_ingredient(user, author_client, recipe_in_cart,
+                                        tags, ingredients):
+    response = author_client.patch(f'/api/recipes/{recipe_in_cart.id}/', {
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredients[0].id, 'amount': 100},
+            {'id': ingredients[3].id, 'amount': 4},
+        ],
+    }, format='json')
+
+    assert response.status_code == 200, response.content
+    assert shopping_list(user) == {ingredients[0].id: 100, ingredients[3].id: 4}
+    assert shopping_list(user) == from_carts(user)
+
+
+@pytest.mark.django_db
+def test_cascades(user, author, recipe_in_cart, create_recipe, ingredients):
+    other = create_recipe(name='Другой', amounts=(1, 1))
+    PurchaseList.objects.create(user=user, recipe=other)
+    assert shopping_list(user) == from_carts(user)
+
+    ingredients[2].delete()
+    assert shopping_list(user) == from_carts(user)
+
+    Recipe.objects.filter(pk=recipe_in_cart.pk).delete()
+    assert shopping_list(user) == {ingredients[0].id: 1, ingredients[1].id: 1}
+
+    PurchaseList.objects.filter(user=user).delete()
+    assert shopping_list(user) == {}
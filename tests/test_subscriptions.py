@@ -0,0 +1,33 @@
+import pytest
+
+
+@pytest.mark.django_db
+def test_subscriptions_without_authors(user_client):
+    response = user_client.get('/api/users/subscriptions/?recipes_limit=3')
+
+    assert response.status_code == 200
+    assert response.data['count'] == 0
+    assert response.data['results'] == []
+
+
+@pytest.mark.django_db
+def test_subscriptions_page_past_the_end(user_client, user, author):
+    user_client.post(f'/api/users/{author.id}/subscribe/')
+
+    response = user_client.get(
+        '/api/users/subscriptions/?recipes_limit=3&page=2'
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_subscriptions_recipes_limit(user_client, author, create_recipe):
+    for i in range(3):
+        create_recipe(name=f'Рецепт {i}')
+    user_client.post(f'/api/users/{author.id}/subscribe/')
+
+    response = user_client.get('/api/users/subscriptions/?recipes_limit=2')
+
+    assert response.status_code == 200
+    assert len(response.data['results'][0]['recipes']) == 2